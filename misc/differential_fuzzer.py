@@ -0,0 +1,415 @@
+"""Differential fuzzer: solution_bf.cpp versus the Python solver engines.
+
+Random small instances are packed into multi-case batches. The brute force
+is compiled once into a driver that loops over the cases of a batch, so a
+single process answers thousands of instances, and the Python engines are
+called in-process on the same cases. Any disagreement is shrunk to a
+minimal failing case before it is reported.
+
+Usage:
+    python misc/differential_fuzzer.py [--batches N] [--batch-size N]
+        [--seed N] [--engines name,name] [--cxx g++] [--all-cases]
+
+Slow engines are checked on a share of each batch (ENGINE_SHARES), and
+the "main" engine runs standard.main on the case, so the automatic
+engine choice is checked end to end.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import standard  # noqa: E402
+
+Case = Tuple[int, int, int, List[int]]
+Answer = Tuple[int, int, List[Tuple[int, int]]]
+
+BATCH_DRIVER = """
+#define main brute_force_main
+#include "{source}"
+#undef main
+
+int main() {{
+    // Switch off stdio sync before the first read; the brute force repeats
+    // the call per case, which is a no-op once the sync is already off.
+    std::ios::sync_with_stdio(false);
+    std::cin.tie(nullptr);
+    int case_count;
+    std::cin >> case_count;
+    for (int case_index = 0; case_index < case_count; case_index++) {{
+        brute_force_main();
+    }}
+    return 0;
+}}
+"""
+
+
+def _run_periodic(values: List[int], m: int, d: int) -> Optional[Tuple[int, list]]:
+    period = standard.detect_period(values, standard.MAX_PERIOD)
+    if not period:
+        return None
+    return standard.solve_periodic(values, period, m, d)
+
+
+def _run_short(values: List[int], m: int, d: int) -> Optional[Tuple[int, list]]:
+    if m > standard.MAX_SHORT_CHANT_LENGTH:
+        return None
+    return standard.solve_short(values, m, d)
+
+
+def _run_threaded(values: List[int], m: int, d: int) -> Optional[Tuple[int, list]]:
+    # Force several workers; the default is one worker (plain solve_general)
+    # on a GIL build, which would leave the threaded merge untested.
+    return standard.solve_threaded(values, m, d, 3)
+
+
+def _case_rng(values: List[int], m: int, d: int) -> random.Random:
+    # Seed from the case itself so a shrunk case replays the same way.
+    return random.Random(repr((values, m, d)))
+
+
+def _run_dynamic(values: List[int], m: int, d: int) -> Optional[Tuple[int, list]]:
+    # Build on a perturbed copy and update every changed position back, so
+    # the answer only matches if update_dynamic_solver moves all chants.
+    rng = _case_rng(values, m, d)
+    perturbed = [
+        rng.choice((value, value + rng.randint(-2, 2), rng.choice(values)))
+        for value in values
+    ]
+    solver = standard.build_dynamic_solver(perturbed, m, d)
+    positions = list(range(1, len(values) + 1))
+    rng.shuffle(positions)
+    for position in positions:
+        if perturbed[position - 1] != values[position - 1]:
+            standard.update_dynamic_solver(solver, position, values[position - 1])
+    return standard.query_dynamic_solver(solver)
+
+
+def _run_range(values: List[int], m: int, d: int) -> Optional[Tuple[int, list]]:
+    # Index the case padded with random stones and query its own window.
+    # Padding drawn from the case keeps its sums in the big groups, so both
+    # the window and the by-size candidate sources are reached; a first
+    # query with another D and a repeat with d go through the jump cache.
+    rng = _case_rng(values, m, d)
+    stones = rng.choice((values, [0], [rng.randint(-10**9, 10**9)]))
+    before = [rng.choice(stones) for _ in range(rng.randint(0, 2 * len(values)))]
+    after = [rng.choice(stones) for _ in range(rng.randint(0, 2 * len(values)))]
+    range_index = standard.build_range_index(before + values + after, m)
+    query_start, query_end = len(before) + 1, len(before) + len(values)
+    standard.query_range(
+        range_index,
+        rng.randint(1, query_start),
+        rng.randint(query_end, query_end + len(after)),
+        rng.randint(0, len(values))
+    )
+    result = standard.query_range(range_index, query_start, query_end, d)
+    repeated = standard.query_range(range_index, query_start, query_end, d)
+    if repeated != result:
+        raise AssertionError(f"repeated query gave {repeated}, first {result}")
+    return result
+
+
+def _run_main(values: List[int], m: int, d: int) -> Optional[Tuple[int, list]]:
+    # Drive standard.main end to end: input parsing, choose_engine and its
+    # dispatch, and the output format, with the chosen engine logged to a
+    # discarded stderr.
+    stdin, argv = sys.stdin, sys.argv
+    sys.stdin = io.TextIOWrapper(io.BytesIO(
+        f"{len(values)} {m} {d}\n{' '.join(map(str, values))}\n".encode()
+    ))
+    sys.argv = argv[:1]
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output), \
+                contextlib.redirect_stderr(io.StringIO()):
+            standard.main()
+    finally:
+        sys.stdin, sys.argv = stdin, argv
+    tokens = [int(token) for token in output.getvalue().split()]
+    return tokens[1], list(zip(tokens[2::2], tokens[3::2]))
+
+
+# Each engine maps (values, M, D) to (best_sum, selected_chants), or to None
+# when it does not apply to the instance.
+ENGINES: Dict[str, Callable[[List[int], int, int], Optional[Tuple[int, list]]]] = {
+    "general": standard.solve_general,
+    "periodic": _run_periodic,
+    "vectorized": standard.solve_vectorized,
+    "short": _run_short,
+    "filtered": standard.solve_filtered,
+    "lazy": standard.solve_lazy,
+    "runs": standard.solve_runs,
+    "threaded": _run_threaded,
+    "dynamic": _run_dynamic,
+    "range": _run_range,
+    "main": _run_main,
+}
+
+# Share of each batch an engine is checked on. The engines that build the
+# 65536-bucket radix per case (about 30 cases/s on the default sizes) and
+# the ones near 1000 cases/s see only a sample, so a default run checks
+# thousands of cases per second; --all-cases checks every engine on all.
+ENGINE_SHARES: Dict[str, float] = {
+    "general": 0.001,
+    "filtered": 0.001,
+    "threaded": 0.001,
+    "range": 0.001,
+    "dynamic": 0.1,
+    "main": 0.1,
+    "vectorized": 0.5,
+    "lazy": 0.5,
+}
+
+
+def compile_reference(build_dir: str, compiler: str) -> str:
+    """Compile solution_bf.cpp into a driver that answers many cases."""
+    driver_path = os.path.join(build_dir, "bf_batch.cpp")
+    binary_path = os.path.join(build_dir, "bf_batch")
+    source_path = os.path.join(REPO_ROOT, "solution_bf.cpp")
+    with open(driver_path, "w", encoding="utf-8") as f:
+        f.write(BATCH_DRIVER.format(source=source_path))
+    subprocess.run(
+        [compiler, "-O2", "-std=c++17", "-o", binary_path, driver_path],
+        check=True,
+    )
+    return binary_path
+
+
+def _format_batch(cases: List[Case]) -> bytes:
+    parts = [f"{len(cases)}\n"]
+    for n, m, d, values in cases:
+        parts.append(f"{n} {m} {d}\n")
+        parts.append(" ".join(map(str, values)) + "\n")
+    return "".join(parts).encode()
+
+
+def run_reference(binary_path: str, cases: List[Case]) -> List[Answer]:
+    """Answer every case of a batch with one brute-force process."""
+    result = subprocess.run(
+        [binary_path],
+        input=_format_batch(cases),
+        capture_output=True,
+        check=True,
+    )
+    tokens = result.stdout.split()
+    answers: List[Answer] = []
+    pos = 0
+    for _ in cases:
+        k = int(tokens[pos])
+        s = int(tokens[pos + 1])
+        pos += 2
+        chants = []
+        for _ in range(k):
+            chants.append((int(tokens[pos]), int(tokens[pos + 1])))
+            pos += 2
+        answers.append((k, s, chants))
+    return answers
+
+
+def run_engine(engine: Callable, case: Case) -> Optional[Answer]:
+    """Answer one case with a Python engine, or None if it does not apply."""
+    _, m, d, values = case
+    result = engine(list(values), m, d)
+    if result is None:
+        return None
+    best_sum, chants = result
+    return (len(chants), best_sum, [tuple(chant) for chant in chants])
+
+
+def random_case(rng: random.Random, max_n: int) -> Case:
+    """Draw a small instance from a mix of shapes that stress the engines."""
+    n = rng.randint(1, max_n)
+    m = rng.randint(1, min(20, rng.choice((2, 4, 8, 20))))
+    d = min(n, rng.choice((0, 0, 1, 2, rng.randint(0, n))))
+    shape = rng.randrange(6)
+
+    if shape == 0:
+        spread = rng.choice((1, 2, 5))
+        values = [rng.randint(-spread, spread) for _ in range(n)]
+    elif shape == 1:
+        base = [rng.randint(-3, 3) for _ in range(rng.randint(1, 6))]
+        values = [base[i % len(base)] for i in range(n)]
+    elif shape == 2:
+        values = [0 if rng.random() < 0.85 else rng.randint(-3, 3) for _ in range(n)]
+    elif shape == 3:
+        values = []
+        while len(values) < n:
+            values.extend([rng.randint(-2, 2)] * rng.randint(1, 10))
+        values = values[:n]
+    elif shape == 4:
+        values = [rng.choice((-10**9, 10**9, 0)) for _ in range(n)]
+    else:
+        values = [rng.randint(-10**9, 10**9) for _ in range(n)]
+
+    return (n, m, d, values)
+
+
+def _shrink_candidates(case: Case) -> List[Case]:
+    """Strictly smaller variants of a case, most aggressive first."""
+    n, m, d, values = case
+    candidates: List[Case] = []
+
+    chunk = n // 2
+    while chunk >= 1:
+        for start in range(0, n - chunk + 1, chunk):
+            rest = values[:start] + values[start + chunk:]
+            if rest:
+                candidates.append((len(rest), m, min(d, len(rest)), rest))
+        chunk //= 2
+
+    if m > 1:
+        candidates.append((n, m - 1, d, values))
+    if d > 0:
+        candidates.append((n, m, 0, values))
+        candidates.append((n, m, d - 1, values))
+
+    for index, value in enumerate(values):
+        for smaller in (0, value // 2, value - (1 if value > 0 else -1)):
+            if abs(smaller) < abs(value):
+                changed = values[:index] + [smaller] + values[index + 1:]
+                candidates.append((n, m, d, changed))
+
+    return candidates
+
+
+def find_mismatches(
+    binary_path: str,
+    engines: Dict[str, Callable],
+    cases: List[Case],
+    timings: Optional[Dict[str, float]] = None,
+    shares: Optional[Dict[str, float]] = None,
+    checks: Optional[Dict[str, int]] = None,
+) -> List[Tuple[int, str, Answer, Optional[Answer]]]:
+    """Compare every engine against the brute force on a batch.
+
+    If shares is given, an engine listed in it is only run on that share
+    of the batch, taken from the front and at least one case. If timings
+    and checks are given, the seconds spent in the brute force ("bf") and
+    in each engine, and the cases each engine answered, are added to them.
+    """
+    if timings is None:
+        timings = {}
+    if shares is None:
+        shares = {}
+    if checks is None:
+        checks = {}
+    started = time.perf_counter()
+    expected = run_reference(binary_path, cases)
+    timings["bf"] = timings.get("bf", 0.0) + time.perf_counter() - started
+    checks["bf"] = checks.get("bf", 0) + len(cases)
+
+    mismatches = []
+    for name, engine in engines.items():
+        case_count = len(cases)
+        if name in shares:
+            case_count = max(1, round(case_count * shares[name]))
+        started = time.perf_counter()
+        for index, case in enumerate(cases[:case_count]):
+            try:
+                got = run_engine(engine, case)
+            except Exception as exc:  # a crash is a mismatch too
+                got = (-1, 0, [("error", repr(exc))])
+            if got is not None and got != expected[index]:
+                mismatches.append((index, name, expected[index], got))
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+        checks[name] = checks.get(name, 0) + case_count
+    mismatches.sort(key=lambda mismatch: mismatch[0])
+    return mismatches
+
+
+def shrink(binary_path: str, engine_name: str, engine: Callable, case: Case) -> Case:
+    """Greedily reduce a failing case while it keeps failing.
+
+    Each round evaluates all candidate reductions in a single brute-force
+    batch and continues from the first one that still fails.
+    """
+    engines = {engine_name: engine}
+    while True:
+        candidates = _shrink_candidates(case)
+        if not candidates:
+            return case
+        failing = find_mismatches(binary_path, engines, candidates)
+        if not failing:
+            return case
+        case = candidates[min(index for index, _, _, _ in failing)]
+
+
+def _format_answer(answer: Optional[Answer]) -> str:
+    if answer is None:
+        return "(not applicable)"
+    k, s, chants = answer
+    return "\n".join([f"{k} {s}"] + [f"{l} {r}" for l, r in chants])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--max-n", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--cxx", default="g++")
+    parser.add_argument("--all-cases", action="store_true")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(1 << 30)
+    rng = random.Random(seed)
+    engines = {name: ENGINES[name] for name in args.engines.split(",")}
+    shares = {} if args.all_cases else ENGINE_SHARES
+    print(f"seed={seed} engines={','.join(engines)}")
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        binary_path = compile_reference(build_dir, args.cxx)
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        checks: Dict[str, int] = {}
+        checked = 0
+
+        for batch_index in range(args.batches):
+            cases = [random_case(rng, args.max_n) for _ in range(args.batch_size)]
+            mismatches = find_mismatches(
+                binary_path, engines, cases, timings, shares, checks
+            )
+            checked += len(cases)
+
+            if mismatches:
+                index, name, _, _ = mismatches[0]
+                minimal = shrink(binary_path, name, engines[name], cases[index])
+                expected = run_reference(binary_path, [minimal])[0]
+                got = run_engine(engines[name], minimal)
+                n, m, d, values = minimal
+                print(f"MISMATCH in engine '{name}' (batch {batch_index})")
+                print("Input:")
+                print(f"{n} {m} {d}")
+                print(" ".join(map(str, values)))
+                print("Expected:")
+                print(_format_answer(expected))
+                print("Got:")
+                print(_format_answer(got))
+                sys.exit(1)
+
+            elapsed = time.perf_counter() - started
+            rates = " ".join(
+                f"{name}={checks[name] / max(seconds, 1e-9):.0f}/s"
+                for name, seconds in timings.items()
+            )
+            print(
+                f"batch {batch_index + 1}/{args.batches}: {checked} cases, "
+                f"{checked / elapsed:.0f} cases/s ({rates})"
+            )
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Judge harness: run standard.py and every candidate in runs/*/ on test_cases/.
+
+Each run is a fresh interpreter with its address space capped by
+RLIMIT_AS and its CPU time capped by RLIMIT_CPU, so a candidate that blows
+the memory limit fails inside the harness the same way it would on the
+judge. Peak RSS and CPU time come from the child's own rusage (wait4), and
+outputs are compared token by token with the expected .out files.
+
+With --engines, standard.py is also judged with each named engine forced
+in place of choose_engine, on the tests plus a generated skewed case where
+almost every chant sums to 0, the input that stresses an engine's memory.
+
+Usage:
+    python misc/judge.py [--time-limit SECONDS] [--memory-limit MB]
+        [--candidates glob,glob] [--tests PATTERN] [--engines name,name]
+        [--verbose]
+"""
+
+import argparse
+import glob
+import os
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, NamedTuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Limits from problem_statement.md.
+TIME_LIMIT_SECONDS = 20
+MEMORY_LIMIT_MB = 256
+
+# The skewed case: all zeros but one distinct positive stone every
+# SKEWED_SPIKE_SPACING stones, so the answer takes every zero on its own.
+SKEWED_LENGTH = 200000
+SKEWED_CHANT_LENGTH = 20
+SKEWED_SPIKE_SPACING = 200
+
+ENGINE_DRIVER = """import sys
+sys.path.insert(0, {repo_root!r})
+import standard
+
+standard.choose_engine = lambda values, max_chant_length: (
+    {engine!r},
+    standard.detect_period(values, standard.MAX_PERIOD),
+    "forced",
+)
+standard.main()
+"""
+
+
+class CaseResult(NamedTuple):
+    verdict: str
+    cpu_seconds: float
+    wall_seconds: float
+    peak_rss_mb: float
+
+
+def discover_candidates(patterns: List[str]) -> Dict[str, str]:
+    """Map a display name to each candidate script matching the patterns."""
+    candidates = {}
+    for pattern in filter(None, patterns):
+        for path in sorted(glob.glob(os.path.join(REPO_ROOT, pattern))):
+            name = os.path.splitext(os.path.relpath(path, REPO_ROOT))[0]
+            if name.startswith("runs" + os.sep):
+                name = name[len("runs" + os.sep):]
+            candidates[name] = path
+    return candidates
+
+
+def discover_tests(pattern: str) -> List[str]:
+    """List the .in files that have a matching .out file."""
+    return [
+        path
+        for path in sorted(glob.glob(os.path.join(REPO_ROOT, pattern)))
+        if os.path.exists(path[:-len(".in")] + ".out")
+    ]
+
+
+def write_skewed_case(directory: str) -> str:
+    """Write the skewed case and its answer; return the .in path."""
+    zero_positions = []
+    values = []
+    for index in range(SKEWED_LENGTH):
+        if index % SKEWED_SPIKE_SPACING:
+            values.append(0)
+            zero_positions.append(index + 1)
+        else:
+            values.append(index // SKEWED_SPIKE_SPACING + 1)
+
+    input_path = os.path.join(directory, "skewed_zeros.in")
+    with open(input_path, "w") as f:
+        f.write(f"{SKEWED_LENGTH} {SKEWED_CHANT_LENGTH} 0\n")
+        f.write(" ".join(map(str, values)) + "\n")
+    with open(input_path[:-len(".in")] + ".out", "w") as f:
+        f.write(f"{len(zero_positions)} 0\n")
+        f.write("".join(
+            f"{position} {position}\n" for position in zero_positions
+        ))
+    return input_path
+
+
+def write_engine_drivers(directory: str, engines: List[str]) -> Dict[str, str]:
+    """Write one script per engine that runs standard.py with it forced."""
+    candidates = {}
+    for engine in engines:
+        driver_path = os.path.join(directory, f"engine_{engine}.py")
+        with open(driver_path, "w") as f:
+            f.write(ENGINE_DRIVER.format(repo_root=REPO_ROOT, engine=engine))
+        candidates[f"standard[{engine}]"] = driver_path
+    return candidates
+
+
+def _limit_resources(time_limit: int, memory_limit_mb: int) -> None:
+    memory_bytes = memory_limit_mb << 20
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    resource.setrlimit(resource.RLIMIT_CPU, (time_limit, time_limit + 1))
+
+
+def run_case(
+    script_path: str,
+    input_path: str,
+    time_limit: int,
+    memory_limit_mb: int
+) -> CaseResult:
+    """Run one candidate on one test case under the judge limits."""
+    expected_path = input_path[:-len(".in")] + ".out"
+    with open(input_path, "rb") as stdin, \
+            tempfile.TemporaryFile() as stdout, \
+            tempfile.TemporaryFile() as stderr:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, script_path],
+            stdin=stdin,
+            stdout=stdout,
+            stderr=stderr,
+            preexec_fn=lambda: _limit_resources(time_limit, memory_limit_mb),
+        )
+        # RLIMIT_CPU does not stop a process that sleeps or blocks, so the
+        # wall clock gets a generous backstop as well.
+        killer = threading.Timer(2 * time_limit + 5, process.kill)
+        killer.start()
+        _, status, usage = os.wait4(process.pid, 0)
+        killer.cancel()
+        process.returncode = os.waitstatus_to_exitcode(status)
+        wall_seconds = time.perf_counter() - started
+
+        cpu_seconds = usage.ru_utime + usage.ru_stime
+        peak_rss_mb = usage.ru_maxrss / 1024
+        stdout.seek(0)
+        output = stdout.read()
+        stderr.seek(0)
+        errors = stderr.read()
+
+    if process.returncode == -signal.SIGXCPU or cpu_seconds > time_limit:
+        verdict = "TLE"
+    elif process.returncode == -signal.SIGKILL:
+        verdict = "TLE" if wall_seconds > 2 * time_limit else "MLE"
+    elif b"MemoryError" in errors or peak_rss_mb > memory_limit_mb:
+        verdict = "MLE"
+    elif process.returncode != 0:
+        verdict = "RE"
+    else:
+        with open(expected_path, "rb") as f:
+            expected = f.read()
+        verdict = "AC" if output.split() == expected.split() else "WA"
+
+    return CaseResult(verdict, cpu_seconds, wall_seconds, peak_rss_mb)
+
+
+def print_leaderboard(
+    results: Dict[str, Dict[str, CaseResult]],
+    test_count: int
+) -> None:
+    """Print one row per candidate, best first."""
+    rows = []
+    for name, case_results in results.items():
+        passed = sum(r.verdict == "AC" for r in case_results.values())
+        total_cpu = sum(r.cpu_seconds for r in case_results.values())
+        max_cpu = max(r.cpu_seconds for r in case_results.values())
+        peak_rss = max(r.peak_rss_mb for r in case_results.values())
+        failures = sorted({
+            r.verdict for r in case_results.values() if r.verdict != "AC"
+        })
+        rows.append((-passed, total_cpu, name, passed, max_cpu, peak_rss, failures))
+    rows.sort()
+
+    name_width = max(len("candidate"), *(len(row[2]) for row in rows))
+    print(
+        f"{'#':>2}  {'candidate':<{name_width}}  {'passed':>9}  "
+        f"{'total cpu':>10}  {'max cpu':>8}  {'peak rss':>9}  failures"
+    )
+    for rank, (_, total_cpu, name, passed, max_cpu, peak_rss, failures) in \
+            enumerate(rows, start=1):
+        print(
+            f"{rank:>2}  {name:<{name_width}}  {passed:>4}/{test_count:<4}  "
+            f"{total_cpu:>9.2f}s  {max_cpu:>7.2f}s  {peak_rss:>6.0f} MB  "
+            f"{','.join(failures) or '-'}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--time-limit", type=int, default=TIME_LIMIT_SECONDS)
+    parser.add_argument("--memory-limit", type=int, default=MEMORY_LIMIT_MB)
+    parser.add_argument("--candidates", default="standard.py,runs/*/*.py")
+    parser.add_argument("--tests", default="test_cases/*.in")
+    parser.add_argument("--engines", default="")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    work_dir = tempfile.TemporaryDirectory()
+    candidates = discover_candidates(args.candidates.split(","))
+    tests = discover_tests(args.tests)
+    if args.engines:
+        candidates.update(
+            write_engine_drivers(work_dir.name, args.engines.split(","))
+        )
+        tests.append(write_skewed_case(work_dir.name))
+    print(
+        f"{len(candidates)} candidates, {len(tests)} tests, "
+        f"limits {args.time_limit}s / {args.memory_limit} MB"
+    )
+
+    results: Dict[str, Dict[str, CaseResult]] = {}
+    for name, script_path in candidates.items():
+        results[name] = {}
+        for input_path in tests:
+            test_name = os.path.splitext(os.path.basename(input_path))[0]
+            result = run_case(
+                script_path,
+                input_path,
+                args.time_limit,
+                args.memory_limit
+            )
+            results[name][test_name] = result
+            if args.verbose or result.verdict != "AC":
+                print(
+                    f"{name} {test_name}: {result.verdict} "
+                    f"cpu={result.cpu_seconds:.2f}s "
+                    f"wall={result.wall_seconds:.2f}s "
+                    f"rss={result.peak_rss_mb:.0f}MB"
+                )
+
+    print()
+    print_leaderboard(results, len(tests))
+    work_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
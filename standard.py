@@ -1,11 +1,55 @@
 """Solution for selecting maximum number of equal-sum segments with spacing."""
 
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import struct
 import sys
 from array import array
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 SUM_BIAS = 1 << 63
 RADIX_MASK = (1 << 16) - 1
 RADIX_SIZE = 1 << 16
+MAX_PERIOD = 256
+MAX_SHORT_CHANT_LENGTH = 2
+SKETCH_MAX_BITS = 24
+DYNAMIC_HEAP_SLACK = 64
+SAMPLE_BLOCKS = 16
+LAZY_PARTITION_SIZE = 1 << 14
+LAZY_PARTITION_SAMPLES = 32
+SKIP_AHEAD_PROBES = 8
+RANGE_JUMP_BASE = 64
+RANGE_JUMP_CACHE_CHANTS = 1 << 22
+RANGE_JUMP_WALK_SHARE = 8
+SAMPLE_BLOCK_LENGTH = 128
+CHANT_INDEX_MAGIC = b"CHANTIDX"
+CHANT_INDEX_VERSION = 1
+# magic, version, M, n, N, group count, sha256 of (values, M)
+CHANT_INDEX_HEADER = struct.Struct("<8sIIQQQ32s")
+VECTOR_CHUNK = 1 << 18
+# engine -> (fixed seconds, microseconds per chant, plus microseconds per
+# chant times the distinct share, the repeated share and the top share)
+ENGINE_COSTS = {
+    "general": (0.13, 6.4, 1.0, 0.0, 0.0),
+    "filtered": (0.0, 3.1, 0.0, 4.1, 0.0),
+    "lazy": (0.0, 1.4, 3.4, 0.0, 0.0),
+    "short": (0.0, 0.55, 2.15, 0.0, 0.0),
+    "vectorized": (0.001, 0.2, 0.0, 0.0, 1.75),
+}
+# Share of the general engine's per-chant cost that threads cannot split.
+THREADED_SERIAL_SHARE = 0.7
+# Run-length engine microseconds per stone, per (run, length) pair and per
+# chant crossing a run boundary.
+RUN_ENGINE_COSTS = (0.3, 0.5, 0.25)
 
 
 def read_input() -> tuple:
@@ -68,8 +112,46 @@ def build_chants(values: list, max_chant_length: int) -> tuple:
     left_positions = array("I", [0]) * total_chants
     right_positions = array("I", [0]) * total_chants
 
-    write_index = 0
-    for left_position in range(1, array_length + 1):
+    fill_chants(
+        values,
+        max_chant_length,
+        (sum_keys, left_positions, right_positions),
+        1,
+        array_length + 1
+    )
+
+    return sum_keys, left_positions, right_positions
+
+
+def fill_chants(
+    values: list,
+    max_chant_length: int,
+    columns: tuple,
+    first_left: int,
+    last_left: int
+) -> None:
+    """Write the chants with l in [first_left, last_left) into columns.
+
+    Chants are laid out by increasing l and then r, so the chants of
+    first_left start right after all chants with a smaller l and disjoint
+    ranges of l never write to the same slots.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+        columns: tuple, (sum_keys, left_positions, right_positions) from
+            build_chants.
+        first_left: int, first left end to write (1-based).
+        last_left: int, left end to stop at (exclusive).
+    """
+    sum_keys, left_positions, right_positions = columns
+    array_length = len(values)
+    write_index = len(sum_keys) - count_total_chants(
+        array_length - first_left + 1,
+        max_chant_length
+    )
+
+    for left_position in range(first_left, last_left):
         running_sum = 0
         max_right = min(array_length, left_position + max_chant_length - 1)
 
@@ -80,8 +162,6 @@ def build_chants(values: list, max_chant_length: int) -> tuple:
             right_positions[write_index] = right_position
             write_index += 1
 
-    return sum_keys, left_positions, right_positions
-
 
 def stable_counting_sort_indices(
     input_indices: array,
@@ -215,44 +295,209 @@ def find_best_sum_group(
         tuple: (best_sum_key, best_group_start, best_group_end)
             The group range is [best_group_start, best_group_end) in sorted order.
     """
-    total_chants = len(sorted_indices)
+    _, best_sum_key, best_group_start, best_group_end = scan_sum_groups(
+        sorted_indices,
+        sum_keys,
+        left_positions,
+        right_positions,
+        min_gap,
+        0,
+        len(sorted_indices)
+    )
+    return best_sum_key, best_group_start, best_group_end
+
+
+def scan_sum_groups(
+    sorted_indices,
+    sum_keys,
+    left_positions,
+    right_positions,
+    min_gap: int,
+    range_start: int,
+    range_end: int
+) -> tuple:
+    """Run the greedy of every group in [range_start, range_end) of sorted order.
+
+    The range must start and end at group boundaries.
+
+    Args:
+        sorted_indices: array('I'), indices sorted by (sum, r, l).
+        sum_keys: array('Q'), sum keys.
+        left_positions: array('I'), l for each chant.
+        right_positions: array('I'), r for each chant.
+        min_gap: int, D.
+        range_start: int, first sorted position to scan.
+        range_end: int, sorted position to stop at (exclusive).
+
+    Returns:
+        tuple: (best_count, best_sum_key, best_group_start, best_group_end)
+            for the best group in the range, with best_count = -1 if the
+            range is empty.
+    """
     best_count = -1
     best_sum_key = 0
     best_group_start = 0
     best_group_end = 0
 
-    position = 0
-    negative_infinity = -10**30
-
-    while position < total_chants:
+    position = range_start
+    while position < range_end:
         group_start = position
-        current_sum_key = sum_keys[sorted_indices[position]]
-
-        last_end = negative_infinity
-        current_count = 0
-
-        while position < total_chants:
-            chant_index = sorted_indices[position]
-            if sum_keys[chant_index] != current_sum_key:
-                break
+        group_end = find_group_end(sorted_indices, sum_keys, group_start, range_end)
+        position = group_end
 
-            left_position = left_positions[chant_index]
-            right_position = right_positions[chant_index]
-            if left_position > last_end + min_gap:
-                current_count += 1
-                last_end = right_position
+        # A group cannot select more chants than it holds.
+        if group_end - group_start <= best_count:
+            continue
 
-            position += 1
-
-        group_end = position
+        current_count = 0
+        min_left = 0
+        position = next_selectable_position(
+            sorted_indices,
+            left_positions,
+            right_positions,
+            group_start,
+            group_end,
+            min_left
+        )
+        while position < group_end:
+            current_count += 1
+            min_left = right_positions[sorted_indices[position]] + min_gap + 1
+            position = next_selectable_position(
+                sorted_indices,
+                left_positions,
+                right_positions,
+                position + 1,
+                group_end,
+                min_left
+            )
 
         if current_count > best_count:
             best_count = current_count
-            best_sum_key = current_sum_key
+            best_sum_key = sum_keys[sorted_indices[group_start]]
             best_group_start = group_start
             best_group_end = group_end
 
-    return best_sum_key, best_group_start, best_group_end
+    return best_count, best_sum_key, best_group_start, best_group_end
+
+
+def gallop_left(sorted_indices, target: int, position: int, end: int, key) -> int:
+    """Find the first position in [position, end) with key >= target.
+
+    key must be non-decreasing over the range. The search probes
+    exponentially growing steps before bisecting, so it costs O(log d) for
+    an answer d positions ahead.
+
+    Args:
+        sorted_indices: array('I'), indices sorted by (sum, r, l).
+        target: int, value to search for.
+        position: int, start of the range.
+        end: int, end of the range (exclusive).
+        key: callable, chant index -> sort key.
+
+    Returns:
+        int: the position, or end if every key is below target.
+    """
+    probe = position
+    step = 1
+    while probe < end and key(sorted_indices[probe]) < target:
+        position = probe + 1
+        probe += step
+        step *= 2
+    return bisect_left(
+        sorted_indices,
+        target,
+        position,
+        min(probe, end),
+        key=key
+    )
+
+
+def find_group_end(
+    sorted_indices,
+    sum_keys,
+    group_start: int,
+    range_end: int
+) -> int:
+    """Find where the group starting at group_start ends.
+
+    Args:
+        sorted_indices: array('I'), indices sorted by (sum, r, l).
+        sum_keys: array('Q'), sum keys.
+        group_start: int, first sorted position of the group.
+        range_end: int, bound on the end of the group (exclusive).
+
+    Returns:
+        int: first sorted position after the group.
+    """
+    return gallop_left(
+        sorted_indices,
+        sum_keys[sorted_indices[group_start]] + 1,
+        group_start + 1,
+        range_end,
+        sum_keys.__getitem__
+    )
+
+
+def next_selectable_position(
+    sorted_indices,
+    left_positions,
+    right_positions,
+    position: int,
+    group_end: int,
+    min_left: int
+) -> int:
+    """Find the first chant at or after position in a group with l >= min_left.
+
+    The next few chants are probed linearly, which is cheapest when
+    selections are dense. Past that, since l <= r, every chant with
+    r < min_left is skipped by galloping on r. Chants with
+    l < min_left <= r end within M - 1 stones of min_left; inside each
+    such r the chants are ordered by l, so one more gallop reaches the
+    first selectable l or the next r.
+
+    Args:
+        sorted_indices: array('I'), indices sorted by (sum, r, l).
+        left_positions: array('I'), l for each chant.
+        right_positions: array('I'), r for each chant.
+        position: int, first sorted position to consider.
+        group_end: int, end of the group in sorted order (exclusive).
+        min_left: int, smallest selectable left end.
+
+    Returns:
+        int: sorted position of the chant, or group_end if there is none.
+    """
+    probe_end = min(group_end, position + SKIP_AHEAD_PROBES)
+    while position < probe_end:
+        if left_positions[sorted_indices[position]] >= min_left:
+            return position
+        position += 1
+
+    position = gallop_left(
+        sorted_indices,
+        min_left,
+        position,
+        group_end,
+        right_positions.__getitem__
+    )
+    while position < group_end:
+        chant_index = sorted_indices[position]
+        if left_positions[chant_index] >= min_left:
+            return position
+        block_end = gallop_left(
+            sorted_indices,
+            right_positions[chant_index] + 1,
+            position,
+            group_end,
+            right_positions.__getitem__
+        )
+        position = gallop_left(
+            sorted_indices,
+            min_left,
+            position,
+            block_end,
+            left_positions.__getitem__
+        )
+    return position
 
 
 def reconstruct_answer(
@@ -277,54 +522,2329 @@ def reconstruct_answer(
         list: list of (l, r) pairs in required output order.
     """
     selected_chants = []
-    negative_infinity = -10**30
-    last_end = negative_infinity
-
-    for position in range(group_start, group_end):
+    position = next_selectable_position(
+        sorted_indices,
+        left_positions,
+        right_positions,
+        group_start,
+        group_end,
+        0
+    )
+    while position < group_end:
         chant_index = sorted_indices[position]
-        left_position = left_positions[chant_index]
         right_position = right_positions[chant_index]
+        selected_chants.append((left_positions[chant_index], right_position))
+        position = next_selectable_position(
+            sorted_indices,
+            left_positions,
+            right_positions,
+            position + 1,
+            group_end,
+            right_position + min_gap + 1
+        )
+
+    return selected_chants
+
+
+def detect_period(values: list, max_period: int) -> int:
+    """Find the smallest period of values, if it is short enough to exploit.
+
+    A period p means values[i] == values[i + p] for every valid i. Only
+    periods with 2 * p <= n are reported, so the array holds at least two
+    full repetitions.
+
+    One prefix-function pass gives the smallest period of every prefix,
+    (i + 1) - border[i]. That period never shrinks as the prefix grows, so
+    the scan stops as soon as it passes the limit. The worst case is a
+    single O(n) pass, paid by periodic arrays and by arrays that stay
+    periodic until near their end. Any period q with
+    2 * q <= n is a multiple of the smallest one (Fine and Wilf), so the
+    smallest period decides whether one up to the limit exists at all.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_period: int, largest period worth reporting.
+
+    Returns:
+        int: the smallest period, or 0 if none up to max_period exists.
+    """
+    array_length = len(values)
+    period_limit = min(max_period, array_length // 2)
+    if period_limit < 1:
+        return 0
+
+    border = [0] * array_length
+    for position in range(1, array_length):
+        value = values[position]
+        border_length = border[position - 1]
+        while border_length and values[border_length] != value:
+            border_length = border[border_length - 1]
+        if values[border_length] == value:
+            border_length += 1
+        border[position] = border_length
+        if position + 1 - border_length > period_limit:
+            return 0
+
+    return array_length - border[-1]
+
+
+def group_periodic_chants(
+    values: list,
+    period: int,
+    max_chant_length: int
+) -> dict:
+    """Group the chants of one period by sum.
+
+    The array is treated as its infinite periodic extension, so a chant is
+    identified by the offset of its left end within the period and its
+    length, and its sum does not depend on which repetition it starts in.
+
+    Args:
+        values: list of int, p-periodic array values (0-based indexing).
+        period: int, the period p.
+        max_chant_length: int, maximum allowed chant length M.
+
+    Returns:
+        dict: sum -> list of (offset, length) pairs.
+    """
+    chant_groups = {}
+    for offset in range(period):
+        running_sum = 0
+        for length in range(1, max_chant_length + 1):
+            running_sum += values[(offset + length - 1) % period]
+            chant_groups.setdefault(running_sum, []).append((offset, length))
+
+    return chant_groups
+
+
+def trace_periodic_greedy(
+    chant_shapes: list,
+    period: int,
+    array_length: int,
+    min_gap: int
+) -> tuple:
+    """Run the greedy for one sum until its selections start repeating.
+
+    The greedy always takes the chant with the smallest (r, l) whose left
+    end is beyond last_end + D. On a periodic array that choice commutes
+    with shifting by the period, so once two selections end at the same
+    residue modulo the period, every later selection repeats the block
+    that followed the earlier one, shifted by a fixed number of positions.
+
+    Args:
+        chant_shapes: list of (offset, length) pairs sharing one sum.
+        period: int, the period p.
+        array_length: int, n.
+        min_gap: int, D.
 
+    Returns:
+        tuple: (selections, cycle_start, cycle_shift)
+            - selections: list of (l, r) pairs up to the first repeat
+            - cycle_start: int, index in selections where the cycle begins,
+              or -1 if the array ends before any repeat
+            - cycle_shift: int, positions the cycle advances per repetition
+    """
+    selections = []
+    seen_residues = {}
+    min_left = 1
+
+    while True:
+        best_right = 0
+        best_left = 0
+        for offset, length in chant_shapes:
+            left_position = min_left + (offset - min_left + 1) % period
+            right_position = left_position + length - 1
+            if (
+                best_right == 0
+                or right_position < best_right
+                or (right_position == best_right and left_position < best_left)
+            ):
+                best_right = right_position
+                best_left = left_position
+
+        if best_right > array_length:
+            return selections, -1, 0
+
+        residue = best_right % period
+        selections.append((best_left, best_right))
+        if residue in seen_residues:
+            previous_index = seen_residues[residue]
+            cycle_shift = best_right - selections[previous_index][1]
+            return selections, previous_index + 1, cycle_shift
+
+        seen_residues[residue] = len(selections) - 1
+        min_left = best_right + min_gap + 1
+
+
+def count_periodic_greedy(
+    selections: list,
+    cycle_start: int,
+    cycle_shift: int,
+    array_length: int
+) -> int:
+    """Count the greedy selections of a traced sum up to the array end.
+
+    Args:
+        selections: list of (l, r) pairs from trace_periodic_greedy.
+        cycle_start: int, index where the cycle begins, or -1.
+        cycle_shift: int, positions the cycle advances per repetition.
+        array_length: int, n.
+
+    Returns:
+        int: number of chants the greedy selects for this sum.
+    """
+    if cycle_start < 0:
+        return len(selections)
+
+    total_count = cycle_start
+    for position in range(cycle_start, len(selections)):
+        right_position = selections[position][1]
+        total_count += (array_length - right_position) // cycle_shift + 1
+
+    return total_count
+
+
+def expand_periodic_greedy(
+    selections: list,
+    cycle_start: int,
+    cycle_shift: int,
+    array_length: int
+) -> list:
+    """Unroll the traced greedy of a sum into its full chant list.
+
+    Args:
+        selections: list of (l, r) pairs from trace_periodic_greedy.
+        cycle_start: int, index where the cycle begins, or -1.
+        cycle_shift: int, positions the cycle advances per repetition.
+        array_length: int, n.
+
+    Returns:
+        list: list of (l, r) pairs in required output order.
+    """
+    if cycle_start < 0:
+        return list(selections)
+
+    selected_chants = list(selections[:cycle_start])
+    cycle = selections[cycle_start:]
+    shift = 0
+
+    while True:
+        for left_position, right_position in cycle:
+            if right_position + shift > array_length:
+                return selected_chants
+            selected_chants.append(
+                (left_position + shift, right_position + shift)
+            )
+        shift += cycle_shift
+
+
+def solve_periodic(
+    values: list,
+    period: int,
+    max_chant_length: int,
+    min_gap: int
+) -> tuple:
+    """Solve a p-periodic array without enumerating all n*M chants.
+
+    Candidate sums and their greedy counts come from a single period, and
+    the counts are extrapolated over the whole array, so the work is
+    O(p^2 * M) plus the size of the printed answer.
+
+    Args:
+        values: list of int, p-periodic array values (0-based indexing).
+        period: int, the period p.
+        max_chant_length: int, maximum allowed chant length M.
+        min_gap: int, D.
+
+    Returns:
+        tuple: (best_sum, selected_chants)
+    """
+    array_length = len(values)
+    chant_groups = group_periodic_chants(values, period, max_chant_length)
+
+    best_count = -1
+    best_sum = 0
+    best_trace = None
+
+    for current_sum in sorted(chant_groups):
+        trace = trace_periodic_greedy(
+            chant_groups[current_sum],
+            period,
+            array_length,
+            min_gap
+        )
+        current_count = count_periodic_greedy(*trace, array_length)
+        if current_count > best_count:
+            best_count = current_count
+            best_sum = current_sum
+            best_trace = trace
+
+    return best_sum, expand_periodic_greedy(*best_trace, array_length)
+
+
+def group_short_chants(values: list, max_chant_length: int) -> dict:
+    """Bucket the chants of a small-M instance by sum in (r, l) order.
+
+    Right ends are visited in increasing order and, for each of them, left
+    ends in increasing order, so appending to the buckets is already the
+    stable (sum, r, l) order and no sort pass is needed.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+
+    Returns:
+        dict: sum -> flat list [l1, r1, l2, r2, ...] in (r, l) order.
+    """
+    chant_groups = {}
+    previous_value = None
+    for right_position, value in enumerate(values, start=1):
+        if max_chant_length > 1 and previous_value is not None:
+            chant_groups.setdefault(previous_value + value, []).extend(
+                (right_position - 1, right_position)
+            )
+        chant_groups.setdefault(value, []).extend(
+            (right_position, right_position)
+        )
+        previous_value = value
+
+    return chant_groups
+
+
+def greedy_short_chants(positions: list, min_gap: int) -> list:
+    """Run the greedy over one bucket from group_short_chants.
+
+    Args:
+        positions: flat list [l1, r1, l2, r2, ...] in (r, l) order.
+        min_gap: int, D.
+
+    Returns:
+        list: flat list of the selected l, r pairs.
+    """
+    selected = []
+    last_end = -10**30
+    position_iterator = iter(positions)
+    for left_position, right_position in zip(
+        position_iterator,
+        position_iterator
+    ):
         if left_position > last_end + min_gap:
-            selected_chants.append((left_position, right_position))
+            selected += (left_position, right_position)
             last_end = right_position
+    return selected
 
-    return selected_chants
 
+def solve_short(values: list, max_chant_length: int, min_gap: int) -> tuple:
+    """Solve the M = 1 and M = 2 cases from plain per-sum position lists.
 
-def main() -> None:
-    """Run the algorithm and print the unique optimal set of chants."""
-    array_length, max_chant_length, min_gap, values = read_input()
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M (1 or 2).
+        min_gap: int, D.
 
-    sum_keys, left_positions, right_positions = build_chants(
+    Returns:
+        tuple: (best_sum, selected_chants)
+    """
+    chant_groups = group_short_chants(values, max_chant_length)
+
+    best_count = -1
+    best_sum = 0
+    best_selected = []
+
+    for current_sum in sorted(chant_groups):
+        positions = chant_groups[current_sum]
+        # A group of k chants yields at most k selections.
+        if len(positions) // 2 <= best_count:
+            continue
+        selected = greedy_short_chants(positions, min_gap)
+        if len(selected) // 2 > best_count:
+            best_count = len(selected) // 2
+            best_sum = current_sum
+            best_selected = selected
+
+    position_iterator = iter(best_selected)
+    return best_sum, list(zip(position_iterator, position_iterator))
+
+
+def encode_runs(values: list) -> list:
+    """Split values into maximal constant runs.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+
+    Returns:
+        list: (start, end, value) per run, 1-based and inclusive.
+    """
+    runs = []
+    run_start = 1
+    for position in range(1, len(values)):
+        if values[position] != values[position - 1]:
+            runs.append((run_start, position, values[position - 1]))
+            run_start = position + 1
+    runs.append((run_start, len(values), values[-1]))
+    return runs
+
+
+def group_run_chants(values: list, runs: list, max_chant_length: int) -> tuple:
+    """Group chants by sum, keeping the chants inside runs in closed form.
+
+    A run of value c and length L holds the chants of sum c * t for every
+    length t <= min(M, L); they are stored as one (start, end, t) entry.
+    A zero run is stored only with t = 1, since among its chants of sum 0
+    a single stone always has the smallest r for a given l. Chants that
+    cross a run boundary are enumerated explicitly, by increasing r and
+    then l, so every list is already in (r, l) order.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        runs: list of (start, end, value) from encode_runs.
+        max_chant_length: int, maximum allowed chant length M.
+
+    Returns:
+        tuple: (crossing_groups, run_groups)
+            - crossing_groups: dict, sum -> list of (r, l)
+            - run_groups: dict, sum -> list of (start, end, t)
+    """
+    run_groups = {}
+    for run_start, run_end, value in runs:
+        if value == 0:
+            run_groups.setdefault(0, []).append((run_start, run_end, 1))
+            continue
+        for length in range(1, min(max_chant_length, run_end - run_start + 1) + 1):
+            run_groups.setdefault(value * length, []).append(
+                (run_start, run_end, length)
+            )
+
+    crossing_groups = {}
+    prefix_sums = [0]
+    for value in values:
+        prefix_sums.append(prefix_sums[-1] + value)
+    for run_start, run_end, _ in runs:
+        for right_position in range(run_start, run_end + 1):
+            min_left = max(1, right_position - max_chant_length + 1)
+            if min_left >= run_start:
+                break
+            for left_position in range(min_left, run_start):
+                chant_sum = (
+                    prefix_sums[right_position] - prefix_sums[left_position - 1]
+                )
+                crossing_groups.setdefault(chant_sum, []).append(
+                    (right_position, left_position)
+                )
+
+    return crossing_groups, run_groups
+
+
+def greedy_run_group(
+    crossing_chants: list,
+    run_chants: list,
+    min_gap: int,
+    selected_chants: list = None
+) -> int:
+    """Run the greedy for one sum over crossing chants and run families.
+
+    The next chant is the smaller in (r, l) order of the first live
+    crossing chant and the first chant of the first live run. While a run
+    keeps winning, its chants are taken in one step: they start every
+    t + D stones until the run ends or the crossing chant comes first.
+
+    Args:
+        crossing_chants: list of (r, l) in (r, l) order.
+        run_chants: list of (start, end, t) in position order.
+        min_gap: int, D.
+        selected_chants: list or None, receives the chosen (l, r) pairs.
+
+    Returns:
+        int: number of chants the greedy selects.
+    """
+    selected_count = 0
+    min_left = 1
+    crossing_index = 0
+    run_index = 0
+
+    while True:
+        while (
+            crossing_index < len(crossing_chants)
+            and crossing_chants[crossing_index][1] < min_left
+        ):
+            crossing_index += 1
+        while run_index < len(run_chants):
+            run_start, run_end, length = run_chants[run_index]
+            if max(run_start, min_left) + length - 1 <= run_end:
+                break
+            run_index += 1
+
+        has_crossing = crossing_index < len(crossing_chants)
+        if run_index == len(run_chants):
+            if not has_crossing:
+                return selected_count
+            run_left = None
+        else:
+            run_left = max(run_start, min_left)
+
+        if has_crossing:
+            crossing_right, crossing_left = crossing_chants[crossing_index]
+            if run_left is None or (crossing_right, crossing_left) < (
+                run_left + length - 1,
+                run_left
+            ):
+                if selected_chants is not None:
+                    selected_chants.append((crossing_left, crossing_right))
+                selected_count += 1
+                min_left = crossing_right + min_gap + 1
+                crossing_index += 1
+                continue
+
+        step = length + min_gap
+        batch_size = (run_end - length + 1 - run_left) // step + 1
+        if has_crossing:
+            last_left = crossing_right - length + 1
+            if last_left >= crossing_left:
+                last_left -= 1
+            batch_size = min(batch_size, (last_left - run_left) // step + 1)
+
+        if selected_chants is not None:
+            for left_position in range(
+                run_left,
+                run_left + batch_size * step,
+                step
+            ):
+                selected_chants.append((left_position, left_position + length - 1))
+        selected_count += batch_size
+        min_left = run_left + (batch_size - 1) * step + step
+
+
+def solve_runs(values: list, max_chant_length: int, min_gap: int) -> tuple:
+    """Solve from the run-length encoding of values.
+
+    Only chants crossing run boundaries are enumerated, so the work is
+    O(n) plus O(M^2) per run boundary and the size of the answer.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+        min_gap: int, D.
+
+    Returns:
+        tuple: (best_sum, selected_chants)
+    """
+    crossing_groups, run_groups = group_run_chants(
         values,
+        encode_runs(values),
         max_chant_length
     )
-    sorted_indices = sort_chants(
-        sum_keys,
-        left_positions,
-        right_positions,
-        array_length
-    )
 
-    best_sum_key, group_start, group_end = find_best_sum_group(
-        sorted_indices,
-        sum_keys,
-        left_positions,
-        right_positions,
-        min_gap
-    )
+    best_count = -1
+    best_sum = 0
+    for current_sum in sorted(crossing_groups.keys() | run_groups.keys()):
+        current_count = greedy_run_group(
+            crossing_groups.get(current_sum, []),
+            run_groups.get(current_sum, []),
+            min_gap
+        )
+        if current_count > best_count:
+            best_count = current_count
+            best_sum = current_sum
 
-    selected_chants = reconstruct_answer(
-        sorted_indices,
-        left_positions,
-        right_positions,
-        group_start,
-        group_end,
-        min_gap
+    selected_chants = []
+    greedy_run_group(
+        crossing_groups.get(best_sum, []),
+        run_groups.get(best_sum, []),
+        min_gap,
+        selected_chants
     )
+    return best_sum, selected_chants
+
+
+def pack_chant_keys(values: list, max_chant_length: int) -> tuple:
+    """Enumerate all chants as two packed 64-bit key arrays.
+
+    Both keys start with the sum shifted to be non-negative, so every sum
+    group is a contiguous block once the keys are sorted:
+        - rl_keys orders a group by (r, l)
+        - lr_keys orders a group by (l, r)
+
+    Chants are laid out in one block per length and the keys are filled
+    block by block, so only the two key arrays are ever full-sized.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+
+    Returns:
+        tuple: (rl_keys, lr_keys, sum_offset, position_bits, length_bits),
+            or None if the fields do not fit into 62 bits.
+    """
+    array_length = len(values)
+    prefix_sums = np.zeros(array_length + 1, dtype=np.int64)
+    np.cumsum(np.asarray(values, dtype=np.int64), out=prefix_sums[1:])
+
+    lengths = range(1, min(max_chant_length, array_length) + 1)
+    block_starts = [0]
+    for length in lengths:
+        block_starts.append(block_starts[-1] + array_length - length + 1)
+
+    lr_keys = np.empty(block_starts[-1], dtype=np.int64)
+    for length, block_start in zip(lengths, block_starts):
+        np.subtract(
+            prefix_sums[length:],
+            prefix_sums[:array_length - length + 1],
+            out=lr_keys[block_start:block_start + array_length - length + 1]
+        )
+    del prefix_sums
+
+    sum_offset = int(lr_keys.min())
+    lr_keys -= sum_offset
+    sum_bits = int(lr_keys.max()).bit_length()
+    position_bits = (array_length + 1).bit_length()
+    length_bits = max(1, (max_chant_length - 1).bit_length())
+    if sum_bits + position_bits + length_bits > 62:
+        return None
+
+    lr_keys <<= position_bits + length_bits
+    rl_keys = np.empty_like(lr_keys)
+    for length, block_start in zip(lengths, block_starts):
+        block = slice(block_start, block_start + array_length - length + 1)
+        left_positions = np.arange(
+            1,
+            array_length - length + 2,
+            dtype=np.int64
+        )
+        rl_keys[block] = lr_keys[block] | (
+            (left_positions + (length - 1)) << length_bits
+        )
+        rl_keys[block] |= max_chant_length - length
+        lr_keys[block] |= left_positions << length_bits
+        lr_keys[block] |= length - 1
+
+    rl_keys.sort()
+    lr_keys.sort()
+    return rl_keys, lr_keys, sum_offset, position_bits, length_bits
+
+
+def find_next_compatible(
+    rl_keys,
+    lr_keys,
+    position_bits: int,
+    length_bits: int,
+    max_chant_length: int,
+    min_gap: int
+):
+    """For every chant, find the chant the greedy takes right after it.
+
+    The successor of a chant (l, r) is the smallest (r', l') in the same
+    sum group with l' > r + D. Over the (l, r)-sorted keys this is a suffix
+    minimum of the (r, l) keys, read at the first l' > r + D; chants of
+    later groups have larger keys and never win while the group still has
+    a candidate. Keys are processed in chunks of VECTOR_CHUNK to keep the
+    temporaries small.
+
+    Args:
+        rl_keys: sorted int64 keys ordered by (sum, r, l).
+        lr_keys: sorted int64 keys ordered by (sum, l, r).
+        position_bits: int, width of the position field.
+        length_bits: int, width of the length field.
+        max_chant_length: int, maximum allowed chant length M.
+        min_gap: int, D.
+
+    Returns:
+        int32 array: successor position in rl_keys for each chant, or
+            len(rl_keys) if the greedy stops there.
+    """
+    total_chants = len(rl_keys)
+    sum_shift = position_bits + length_bits
+    length_mask = (1 << length_bits) - 1
+    position_mask = (1 << position_bits) - 1
+
+    suffix_minimum = np.empty(total_chants + 1, dtype=np.int64)
+    suffix_minimum[total_chants] = np.iinfo(np.int64).max
+    for chunk_start in range(0, total_chants, VECTOR_CHUNK):
+        keys = lr_keys[chunk_start:chunk_start + VECTOR_CHUNK]
+        chant_lengths = keys & length_mask
+        right_positions = (keys >> length_bits) & position_mask
+        right_positions += chant_lengths
+        rl_chunk = (keys >> sum_shift) << sum_shift
+        rl_chunk |= right_positions << length_bits
+        rl_chunk |= (max_chant_length - 1) - chant_lengths
+        suffix_minimum[chunk_start:chunk_start + len(keys)] = rl_chunk
+    np.minimum.accumulate(
+        suffix_minimum[::-1],
+        out=suffix_minimum[::-1]
+    )
+
+    next_positions = np.empty(total_chants, dtype=np.int32)
+    for chunk_start in range(0, total_chants, VECTOR_CHUNK):
+        keys = rl_keys[chunk_start:chunk_start + VECTOR_CHUNK]
+        sum_fields = keys >> sum_shift
+        min_lefts = (keys >> length_bits) & position_mask
+        min_lefts += min_gap + 1
+        np.minimum(min_lefts, position_mask, out=min_lefts)
+        probes = (sum_fields << sum_shift) | (min_lefts << length_bits)
+
+        candidates = suffix_minimum[np.searchsorted(lr_keys, probes)]
+        positions = np.searchsorted(rl_keys, candidates)
+        positions[(candidates >> sum_shift) != sum_fields] = total_chants
+        next_positions[chunk_start:chunk_start + len(keys)] = positions
+
+    return next_positions
+
+
+def count_chain_lengths(next_positions):
+    """Count the greedy chain length from every chant by pointer jumping.
+
+    Each round doubles the distance covered by every pointer, so the chains
+    of all sum groups are measured together in O(log N) vectorized rounds.
+
+    Args:
+        next_positions: int32 array of successor positions, with the value
+            len(next_positions) marking the end of a chain.
+
+    Returns:
+        int32 array: number of chants on the chain starting at each chant.
+    """
+    total_chants = len(next_positions)
+    jumps = np.empty(total_chants + 1, dtype=np.int32)
+    jumps[:total_chants] = next_positions
+    jumps[total_chants] = total_chants
+    chain_lengths = np.ones(total_chants + 1, dtype=np.int32)
+    chain_lengths[total_chants] = 0
+
+    for _ in range(total_chants.bit_length()):
+        chain_lengths += chain_lengths[jumps]
+        jumps = jumps[jumps]
+        if jumps[0] == total_chants and (jumps == total_chants).all():
+            break
+
+    return chain_lengths[:total_chants]
+
+
+def solve_vectorized(
+    values: list,
+    max_chant_length: int,
+    min_gap: int
+) -> tuple:
+    """Solve with NumPy, running the greedy of every sum group at once.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+        min_gap: int, D.
+
+    Returns:
+        tuple: (best_sum, selected_chants), or None if NumPy is missing or
+            the packed keys would overflow.
+    """
+    if np is None:
+        return None
+
+    packed = pack_chant_keys(values, max_chant_length)
+    if packed is None:
+        return None
+    rl_keys, lr_keys, sum_offset, position_bits, length_bits = packed
+
+    next_positions = find_next_compatible(
+        rl_keys,
+        lr_keys,
+        position_bits,
+        length_bits,
+        max_chant_length,
+        min_gap
+    )
+    del lr_keys
+
+    sum_shift = position_bits + length_bits
+    total_chants = len(rl_keys)
+    is_group_start = np.empty(total_chants, dtype=np.bool_)
+    is_group_start[0] = True
+    for chunk_start in range(1, total_chants, VECTOR_CHUNK):
+        chunk_end = min(chunk_start + VECTOR_CHUNK, total_chants)
+        np.not_equal(
+            rl_keys[chunk_start:chunk_end] >> sum_shift,
+            rl_keys[chunk_start - 1:chunk_end - 1] >> sum_shift,
+            out=is_group_start[chunk_start:chunk_end]
+        )
+
+    chain_lengths = count_chain_lengths(next_positions)
+    chain_lengths[~is_group_start] = 0
+    best_start = int(np.argmax(chain_lengths))
+    del chain_lengths, is_group_start
+
+    length_mask = (1 << length_bits) - 1
+    position_mask = (1 << position_bits) - 1
+    selected_chants = []
+    position = best_start
+    while position < total_chants:
+        key = int(rl_keys[position])
+        right_position = (key >> length_bits) & position_mask
+        left_position = (
+            right_position - (max_chant_length - 1) + (key & length_mask)
+        )
+        selected_chants.append((left_position, right_position))
+        position = int(next_positions[position])
+
+    best_sum = (int(rl_keys[best_start]) >> sum_shift) + sum_offset
+    return best_sum, selected_chants
+
+
+def solve_general(
+    values: list,
+    max_chant_length: int,
+    min_gap: int
+) -> tuple:
+    """Solve by enumerating, sorting and scanning every chant.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+        min_gap: int, D.
+
+    Returns:
+        tuple: (best_sum, selected_chants)
+    """
+    sum_keys, left_positions, right_positions = build_chants(
+        values,
+        max_chant_length
+    )
+    sorted_indices = sort_chants(
+        sum_keys,
+        left_positions,
+        right_positions,
+        len(values)
+    )
+
+    best_sum_key, group_start, group_end = find_best_sum_group(
+        sorted_indices,
+        sum_keys,
+        left_positions,
+        right_positions,
+        min_gap
+    )
+
+    selected_chants = reconstruct_answer(
+        sorted_indices,
+        left_positions,
+        right_positions,
+        group_start,
+        group_end,
+        min_gap
+    )
+
+    return int(best_sum_key - SUM_BIAS), selected_chants
+
+
+def sketch_chant_sums(values: list, max_chant_length: int) -> tuple:
+    """First pass: count chant sums in a bounded saturating sketch.
+
+    Every sum is counted in one byte-sized bucket of a table with at least
+    four buckets per chant (capped at 2^SKETCH_MAX_BITS), so a bucket count
+    never underestimates the occurrences of any sum hashed into it. The
+    pass also finds the chant that wins when no sum occurs twice: the
+    smallest sum, first in (r, l) order.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+
+    Returns:
+        tuple: (sketch, bucket_bits, min_chant)
+            - sketch: array('B') of saturated bucket counts
+            - bucket_bits: int, log2 of the number of buckets
+            - min_chant: (sum, r, l) of the smallest chant
+    """
+    array_length = len(values)
+    total_chants = count_total_chants(array_length, max_chant_length)
+    bucket_bits = min(SKETCH_MAX_BITS, (4 * total_chants).bit_length())
+    bucket_mask = (1 << bucket_bits) - 1
+    sketch = array("B", [0]) * (1 << bucket_bits)
+    min_chant = (values[0], 1, 1)
+
+    for left_position in range(1, array_length + 1):
+        running_sum = 0
+        max_right = min(array_length, left_position + max_chant_length - 1)
+
+        for right_position in range(left_position, max_right + 1):
+            running_sum += values[right_position - 1]
+            bucket = (running_sum ^ (running_sum >> bucket_bits)) & bucket_mask
+            if sketch[bucket] < 255:
+                sketch[bucket] += 1
+            if running_sum <= min_chant[0]:
+                min_chant = min(
+                    min_chant,
+                    (running_sum, right_position, left_position)
+                )
+
+    return sketch, bucket_bits, min_chant
+
+
+def build_competitive_chants(
+    values: list,
+    max_chant_length: int,
+    sketch: array,
+    bucket_bits: int,
+    min_count: int
+) -> tuple:
+    """Second pass: enumerate only chants whose sum may occur min_count times.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+        sketch: array('B'), bucket counts from sketch_chant_sums.
+        bucket_bits: int, log2 of the number of buckets.
+        min_count: int, smallest bucket count worth keeping.
+
+    Returns:
+        tuple: (sum_keys, left_positions, right_positions) in the layout of
+            build_chants, restricted to the competitive chants.
+    """
+    array_length = len(values)
+    bucket_mask = (1 << bucket_bits) - 1
+    sum_keys = array("Q")
+    left_positions = array("I")
+    right_positions = array("I")
+
+    for left_position in range(1, array_length + 1):
+        running_sum = 0
+        max_right = min(array_length, left_position + max_chant_length - 1)
+
+        for right_position in range(left_position, max_right + 1):
+            running_sum += values[right_position - 1]
+            bucket = (running_sum ^ (running_sum >> bucket_bits)) & bucket_mask
+            if sketch[bucket] >= min_count:
+                sum_keys.append(running_sum + SUM_BIAS)
+                left_positions.append(left_position)
+                right_positions.append(right_position)
+
+    return sum_keys, left_positions, right_positions
+
+
+def solve_filtered(
+    values: list,
+    max_chant_length: int,
+    min_gap: int
+) -> tuple:
+    """Solve like solve_general, but sort only the competitive sum groups.
+
+    The single-stone greedy of solve_short gives a lower bound k0 on the
+    answer. A sum whose sketch count is below max(k0, 2) cannot reach that
+    many chants, so it can only win when the answer is 1; that case is
+    settled by the smallest chant seen in the first pass.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+        min_gap: int, D.
+
+    Returns:
+        tuple: (best_sum, selected_chants)
+    """
+    lower_bound = len(solve_short(values, 1, min_gap)[1])
+    min_count = min(max(lower_bound, 2), 255)
+
+    sketch, bucket_bits, min_chant = sketch_chant_sums(
+        values,
+        max_chant_length
+    )
+    sum_keys, left_positions, right_positions = build_competitive_chants(
+        values,
+        max_chant_length,
+        sketch,
+        bucket_bits,
+        min_count
+    )
+    del sketch
+
+    if sum_keys:
+        sorted_indices = sort_chants(
+            sum_keys,
+            left_positions,
+            right_positions,
+            len(values)
+        )
+        best_sum_key, group_start, group_end = find_best_sum_group(
+            sorted_indices,
+            sum_keys,
+            left_positions,
+            right_positions,
+            min_gap
+        )
+        selected_chants = reconstruct_answer(
+            sorted_indices,
+            left_positions,
+            right_positions,
+            group_start,
+            group_end,
+            min_gap
+        )
+        if len(selected_chants) >= min_count:
+            return int(best_sum_key - SUM_BIAS), selected_chants
+
+    min_sum, right_position, left_position = min_chant
+    return min_sum, [(left_position, right_position)]
+
+
+def iter_sum_groups(values: list, max_chant_length: int):
+    """Yield the sum groups of all chants lazily, in ascending sum order.
+
+    A first pass samples the chants of every k-th left end, about
+    LAZY_PARTITION_SAMPLES per partition, and cuts the sum axis at the
+    sample's quantiles so that partitions hold about LAZY_PARTITION_SIZE
+    chants each. A sum filling a whole quantile of the sample gets a
+    partition of its own, which stores only the chant's encode_chant key
+    and is put in (r, l) order by a counting pass over r. A second pass
+    appends every other chant to its partition as a single packed key,
+    sum * K + encode_chant(l, r), so the working set is 4 or 8 bytes per
+    chant plus the one partition being ordered. The consumer may send()
+    its best greedy count so far; a partition with no more chants than
+    that cannot hold a winning group and is skipped without being sorted.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+
+    Yields:
+        tuple: (group_sum, group_lefts, group_rights), with the l and r of
+            the group's chants as array('I') in (r, l) order.
+    """
+    array_length = len(values)
+    total_chants = count_total_chants(array_length, max_chant_length)
+    partition_count = max(1, total_chants // LAZY_PARTITION_SIZE)
+    sampled_lefts = max(
+        1,
+        partition_count * LAZY_PARTITION_SAMPLES // max_chant_length
+    )
+    sample_sums = []
+    for left_position in range(
+        0,
+        array_length,
+        max(1, array_length // sampled_lefts)
+    ):
+        running_sum = 0
+        for value in values[left_position:left_position + max_chant_length]:
+            running_sum += value
+            sample_sums.append(running_sum)
+    sample_sums.sort()
+
+    # Partition p holds the sums in [sum_cuts[p - 1], sum_cuts[p]).
+    quantile = max(1, len(sample_sums) // partition_count)
+    sum_cuts = []
+    single_sum_partitions = set()
+    pending_samples = 0
+    group_start = 0
+    while group_start < len(sample_sums):
+        chant_sum = sample_sums[group_start]
+        group_end = bisect_left(sample_sums, chant_sum + 1, group_start)
+        if group_end - group_start >= quantile:
+            if not sum_cuts or sum_cuts[-1] != chant_sum:
+                sum_cuts.append(chant_sum)
+            single_sum_partitions.add(len(sum_cuts))
+            sum_cuts.append(chant_sum + 1)
+            pending_samples = 0
+        else:
+            pending_samples += group_end - group_start
+            if pending_samples >= quantile:
+                sum_cuts.append(chant_sum + 1)
+                pending_samples = 0
+        group_start = group_end
+    del sample_sums
+
+    key_span = (array_length + 1) * max_chant_length
+    max_abs_sum = max_chant_length * max(map(abs, values))
+    if (max_abs_sum + 1) * key_span < 1 << 63:
+        partitions = [array("q") for _ in range(len(sum_cuts) + 1)]
+    else:
+        partitions = [[] for _ in range(len(sum_cuts) + 1)]
+    for partition in single_sum_partitions:
+        partitions[partition] = array("I")
+
+    for left_position in range(1, array_length + 1):
+        running_sum = 0
+        max_right = min(array_length, left_position + max_chant_length - 1)
+        # encode_chant(l, r) is r * (M - 1) plus this, for every r.
+        key_offset = left_position + max_chant_length - 1
+
+        for right_position in range(left_position, max_right + 1):
+            running_sum += values[right_position - 1]
+            partition = bisect_right(sum_cuts, running_sum)
+            chant_key = right_position * (max_chant_length - 1) + key_offset
+            if partition in single_sum_partitions:
+                partitions[partition].append(chant_key)
+            else:
+                partitions[partition].append(running_sum * key_span + chant_key)
+
+    best_count = -1
+    for partition in range(len(partitions)):
+        chant_keys = partitions[partition]
+        partitions[partition] = None
+        if len(chant_keys) <= best_count:
+            continue
+
+        if partition in single_sum_partitions:
+            group_lefts, group_rights = order_chant_keys(
+                chant_keys,
+                array_length,
+                max_chant_length
+            )
+            del chant_keys
+            sent_count = yield sum_cuts[partition - 1], group_lefts, group_rights
+            if sent_count is not None:
+                best_count = sent_count
+            continue
+
+        packed_keys = sorted(chant_keys)
+        del chant_keys
+        group_start = 0
+        while group_start < len(packed_keys):
+            group_sum = packed_keys[group_start] // key_span
+            group_end = bisect_left(
+                packed_keys,
+                (group_sum + 1) * key_span,
+                group_start
+            )
+
+            group_lefts = array("I")
+            group_rights = array("I")
+            for position in range(group_start, group_end):
+                right_position, length_field = divmod(
+                    packed_keys[position] - group_sum * key_span,
+                    max_chant_length
+                )
+                group_rights.append(right_position)
+                group_lefts.append(
+                    right_position - max_chant_length + 1 + length_field
+                )
+
+            sent_count = yield group_sum, group_lefts, group_rights
+            if sent_count is not None:
+                best_count = sent_count
+            group_start = group_end
+
+
+def order_chant_keys(
+    chant_keys: array,
+    array_length: int,
+    max_chant_length: int
+) -> tuple:
+    """Decode encode_chant keys of one sum group into (r, l) order.
+
+    A counting pass over r places the chants; keys appended in ascending
+    l stay in ascending l within each r.
+
+    Args:
+        chant_keys: array('I') of encode_chant keys, in ascending l.
+        array_length: int, n.
+        max_chant_length: int, maximum allowed chant length M.
+
+    Returns:
+        tuple: (group_lefts, group_rights) as array('I') in (r, l) order.
+    """
+    next_slots = array("I", [0]) * (array_length + 2)
+    for chant_key in chant_keys:
+        next_slots[chant_key // max_chant_length + 1] += 1
+    for right_position in range(1, array_length + 2):
+        next_slots[right_position] += next_slots[right_position - 1]
+
+    group_lefts = array("I", [0]) * len(chant_keys)
+    group_rights = array("I", [0]) * len(chant_keys)
+    for chant_key in chant_keys:
+        right_position, length_field = divmod(chant_key, max_chant_length)
+        slot = next_slots[right_position]
+        next_slots[right_position] = slot + 1
+        group_rights[slot] = right_position
+        group_lefts[slot] = right_position - max_chant_length + 1 + length_field
+
+    return group_lefts, group_rights
+
+
+def solve_lazy(values: list, max_chant_length: int, min_gap: int) -> tuple:
+    """Solve by scanning the groups of iter_sum_groups with early stops.
+
+    Groups no larger than the best count are skipped, and the scan ends as
+    soon as the best count reaches (n + D) // (D + 1), the most chants that
+    fit into the array at all.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+        min_gap: int, D.
+
+    Returns:
+        tuple: (best_sum, selected_chants)
+    """
+    count_limit = (len(values) + min_gap) // (min_gap + 1)
+    best_count = -1
+    best_sum = 0
+    best_chants = []
+
+    sum_groups = iter_sum_groups(values, max_chant_length)
+    group = next(sum_groups)
+    while True:
+        group_sum, group_lefts, group_rights = group
+        if len(group_lefts) > best_count:
+            selected_chants = []
+            last_end = -10**30
+            for left_position, right_position in zip(group_lefts, group_rights):
+                if left_position > last_end + min_gap:
+                    selected_chants.append((left_position, right_position))
+                    last_end = right_position
+
+            if len(selected_chants) > best_count:
+                best_count = len(selected_chants)
+                best_sum = group_sum
+                best_chants = selected_chants
+                if best_count >= count_limit:
+                    break
+
+        try:
+            group = sum_groups.send(best_count)
+        except StopIteration:
+            break
+
+    return best_sum, best_chants
+
+
+def gil_disabled() -> bool:
+    """Tell whether this interpreter runs Python threads in parallel."""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def build_chants_threaded(
+    values: list,
+    max_chant_length: int,
+    executor: ThreadPoolExecutor,
+    worker_count: int
+) -> tuple:
+    """Like build_chants, with each worker filling a range of left ends.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+        executor: ThreadPoolExecutor running the workers.
+        worker_count: int, number of ranges to split into.
+
+    Returns:
+        tuple: (sum_keys, left_positions, right_positions) as in build_chants.
+    """
+    array_length = len(values)
+    total_chants = count_total_chants(array_length, max_chant_length)
+    columns = (
+        array("Q", [0]) * total_chants,
+        array("I", [0]) * total_chants,
+        array("I", [0]) * total_chants
+    )
+
+    boundaries = [
+        1 + array_length * worker // worker_count
+        for worker in range(worker_count + 1)
+    ]
+    futures = [
+        executor.submit(
+            fill_chants,
+            values,
+            max_chant_length,
+            columns,
+            first_left,
+            last_left
+        )
+        for first_left, last_left in zip(boundaries, boundaries[1:])
+        if first_left < last_left
+    ]
+    for future in futures:
+        future.result()
+
+    return columns
+
+
+def find_best_sum_group_threaded(
+    sorted_indices: array,
+    sum_keys: array,
+    left_positions: array,
+    right_positions: array,
+    min_gap: int,
+    executor: ThreadPoolExecutor,
+    worker_count: int
+) -> tuple:
+    """Like find_best_sum_group, with workers scanning runs of whole groups.
+
+    The sorted order is cut into worker_count ranges, each cut moved
+    forward to the next group boundary by galloping. Ranges are in
+    ascending sum order, so the first range holding the best count also
+    holds the smallest sum.
+
+    Args:
+        sorted_indices: array('I'), indices sorted by (sum, r, l).
+        sum_keys: array('Q'), sum keys.
+        left_positions: array('I'), l for each chant.
+        right_positions: array('I'), r for each chant.
+        min_gap: int, D.
+        executor: ThreadPoolExecutor running the workers.
+        worker_count: int, number of ranges to split into.
+
+    Returns:
+        tuple: (best_sum_key, best_group_start, best_group_end) as in
+            find_best_sum_group.
+    """
+    total_chants = len(sorted_indices)
+    boundaries = [0]
+    for worker in range(1, worker_count):
+        cut = max(boundaries[-1], total_chants * worker // worker_count)
+        if 0 < cut < total_chants and (
+            sum_keys[sorted_indices[cut]] == sum_keys[sorted_indices[cut - 1]]
+        ):
+            cut = find_group_end(sorted_indices, sum_keys, cut - 1, total_chants)
+        boundaries.append(cut)
+    boundaries.append(total_chants)
+
+    futures = [
+        executor.submit(
+            scan_sum_groups,
+            sorted_indices,
+            sum_keys,
+            left_positions,
+            right_positions,
+            min_gap,
+            range_start,
+            range_end
+        )
+        for range_start, range_end in zip(boundaries, boundaries[1:])
+        if range_start < range_end
+    ]
+
+    best_result = (-1, 0, 0, 0)
+    for future in futures:
+        result = future.result()
+        if result[0] > best_result[0]:
+            best_result = result
+
+    return best_result[1:]
+
+
+def solve_threaded(
+    values: list,
+    max_chant_length: int,
+    min_gap: int,
+    worker_count: int = None
+) -> tuple:
+    """Solve like solve_general, building and scanning chants in threads.
+
+    The columns are shared between threads, which only pays off on
+    free-threaded builds. By default one worker per CPU is used there, and
+    the plain serial solve_general everywhere else.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+        min_gap: int, D.
+        worker_count: int or None, number of threads.
+
+    Returns:
+        tuple: (best_sum, selected_chants)
+    """
+    if worker_count is None:
+        worker_count = (os.cpu_count() or 1) if gil_disabled() else 1
+    if worker_count <= 1:
+        return solve_general(values, max_chant_length, min_gap)
+
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        sum_keys, left_positions, right_positions = build_chants_threaded(
+            values,
+            max_chant_length,
+            executor,
+            worker_count
+        )
+        sorted_indices = sort_chants(
+            sum_keys,
+            left_positions,
+            right_positions,
+            len(values)
+        )
+        best_sum_key, group_start, group_end = find_best_sum_group_threaded(
+            sorted_indices,
+            sum_keys,
+            left_positions,
+            right_positions,
+            min_gap,
+            executor,
+            worker_count
+        )
+
+    selected_chants = reconstruct_answer(
+        sorted_indices,
+        left_positions,
+        right_positions,
+        group_start,
+        group_end,
+        min_gap
+    )
+
+    return int(best_sum_key - SUM_BIAS), selected_chants
+
+
+def compute_group_starts(sorted_indices: array, sum_keys: array) -> array:
+    """Find where each sum group starts in sorted order.
+
+    Args:
+        sorted_indices: array('I'), indices sorted by (sum, r, l).
+        sum_keys: array('Q'), sum keys.
+
+    Returns:
+        array('I'): start of each group in sorted order, followed by N.
+    """
+    group_starts = array("I")
+    previous_sum_key = None
+    for position in range(len(sorted_indices)):
+        current_sum_key = sum_keys[sorted_indices[position]]
+        if current_sum_key != previous_sum_key:
+            group_starts.append(position)
+            previous_sum_key = current_sum_key
+    group_starts.append(len(sorted_indices))
+    return group_starts
+
+
+def values_digest(values: list, max_chant_length: int) -> bytes:
+    """Fingerprint the (values, M) pair a chant index was built for."""
+    digest = hashlib.sha256(array("q", values).tobytes())
+    digest.update(max_chant_length.to_bytes(4, "little"))
+    return digest.digest()
+
+
+def save_chant_index(path: str, values: list, max_chant_length: int) -> None:
+    """Build, sort and store the chants of (values, M) in a binary file.
+
+    The file is a CHANT_INDEX_HEADER followed by the sum_keys, l and r
+    columns, the sorted indices and the group starts, in native byte
+    order. It is written under a temporary name and renamed into place,
+    so concurrent readers never see a partial file.
+
+    Args:
+        path: str, destination file.
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+    """
+    sum_keys, left_positions, right_positions = build_chants(
+        values,
+        max_chant_length
+    )
+    sorted_indices = sort_chants(
+        sum_keys,
+        left_positions,
+        right_positions,
+        len(values)
+    )
+    group_starts = compute_group_starts(sorted_indices, sum_keys)
+
+    header = CHANT_INDEX_HEADER.pack(
+        CHANT_INDEX_MAGIC,
+        CHANT_INDEX_VERSION,
+        max_chant_length,
+        len(values),
+        len(sum_keys),
+        len(group_starts) - 1,
+        values_digest(values, max_chant_length)
+    )
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as index_file:
+        index_file.write(header)
+        for column in (
+            sum_keys,
+            left_positions,
+            right_positions,
+            sorted_indices,
+            group_starts
+        ):
+            column.tofile(index_file)
+    os.replace(temporary_path, path)
+
+
+def load_chant_index(path: str, values: list, max_chant_length: int):
+    """Memory-map a chant index saved by save_chant_index.
+
+    Args:
+        path: str, index file.
+        values: list of int, the array the index must have been built for.
+        max_chant_length: int, the M it must have been built for.
+
+    Returns:
+        tuple: (sum_keys, left_positions, right_positions, sorted_indices,
+            group_starts) as read-only memoryviews over the file, or None
+            if the file is missing, has another version, or was built for
+            different (values, M).
+    """
+    try:
+        with open(path, "rb") as index_file:
+            mapped = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if len(mapped) < CHANT_INDEX_HEADER.size:
+        return None
+    (
+        magic,
+        version,
+        stored_chant_length,
+        array_length,
+        total_chants,
+        group_count,
+        digest
+    ) = CHANT_INDEX_HEADER.unpack_from(mapped)
+    expected_size = CHANT_INDEX_HEADER.size + 20 * total_chants + 4 * (
+        group_count + 1
+    )
+    if (
+        magic != CHANT_INDEX_MAGIC
+        or version != CHANT_INDEX_VERSION
+        or stored_chant_length != max_chant_length
+        or array_length != len(values)
+        or len(mapped) != expected_size
+        or digest != values_digest(values, max_chant_length)
+    ):
+        return None
+
+    view = memoryview(mapped)
+    offset = CHANT_INDEX_HEADER.size
+    columns = []
+    for typecode, length in (
+        ("Q", total_chants),
+        ("I", total_chants),
+        ("I", total_chants),
+        ("I", total_chants),
+        ("I", group_count + 1)
+    ):
+        end = offset + array(typecode).itemsize * length
+        columns.append(view[offset:end].cast(typecode))
+        offset = end
+    return tuple(columns)
+
+
+def solve_from_chant_index(chant_index: tuple, min_gap: int) -> tuple:
+    """Solve for one D from a loaded chant index, skipping build and sort.
+
+    Args:
+        chant_index: tuple from load_chant_index.
+        min_gap: int, D.
+
+    Returns:
+        tuple: (best_sum, selected_chants)
+    """
+    sum_keys, left_positions, right_positions, sorted_indices, _ = chant_index
+
+    best_sum_key, group_start, group_end = find_best_sum_group(
+        sorted_indices,
+        sum_keys,
+        left_positions,
+        right_positions,
+        min_gap
+    )
+
+    selected_chants = reconstruct_answer(
+        sorted_indices,
+        left_positions,
+        right_positions,
+        group_start,
+        group_end,
+        min_gap
+    )
+
+    return int(best_sum_key - SUM_BIAS), selected_chants
+
+
+def build_range_index(values: list, max_chant_length: int) -> tuple:
+    """Build an index that answers the problem on any subarray of values.
+
+    The chants come from build_chants and sort_chants. Besides the
+    (sum, r, l) order, every sum group keeps its chants ordered by (l, r)
+    together with the suffix minimum of their sorted positions, which finds
+    the first chant in (r, l) order whose left end is at least some bound.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+
+    Returns:
+        tuple: (group_sums, group_starts, sorted_lefts, sorted_rights,
+            lr_lefts, lr_first, groups_by_size, prefix_sums,
+            max_chant_length, jump_cache, cached_chants)
+            - group_sums: list of int, the sum of each group, ascending
+            - group_starts: array('I'), start of each group in sorted
+              order, followed by N
+            - sorted_lefts: array('I'), l of each chant in sorted order
+            - sorted_rights: array('I'), r of each chant in sorted order
+            - lr_lefts: array('I'), l of each chant in (sum, l, r) order
+            - lr_first: array('I'), smallest sorted position from this
+              (sum, l, r) slot to the end of its group
+            - groups_by_size: array('I'), group numbers by decreasing
+              size, then increasing sum
+            - prefix_sums: list of int, prefix sums of values
+            - max_chant_length: int, M
+            - jump_cache: dict, (group, D) -> jump tables from
+              group_jump_tables
+            - cached_chants: list holding the number of chants covered by
+              jump_cache, kept at most RANGE_JUMP_CACHE_CHANTS
+    """
+    sum_keys, left_positions, right_positions = build_chants(
+        values,
+        max_chant_length
+    )
+    sorted_indices = sort_chants(
+        sum_keys,
+        left_positions,
+        right_positions,
+        len(values)
+    )
+    total_chants = len(sorted_indices)
+
+    sorted_lefts = array("I", [left_positions[i] for i in sorted_indices])
+    sorted_rights = array("I", [right_positions[i] for i in sorted_indices])
+
+    group_starts = compute_group_starts(sorted_indices, sum_keys)
+    group_sums = [
+        sum_keys[sorted_indices[group_start]] - SUM_BIAS
+        for group_start in group_starts[:-1]
+    ]
+    del sum_keys, left_positions, right_positions, sorted_indices
+
+    lr_lefts = array("I", [0]) * total_chants
+    lr_first = array("I", [0]) * total_chants
+    for group in range(len(group_sums)):
+        group_start = group_starts[group]
+        group_end = group_starts[group + 1]
+        lr_order = sorted(
+            range(group_start, group_end),
+            key=sorted_lefts.__getitem__
+        )
+
+        smallest_position = total_chants
+        for slot in range(group_end - 1, group_start - 1, -1):
+            position = lr_order[slot - group_start]
+            lr_lefts[slot] = sorted_lefts[position]
+            smallest_position = min(smallest_position, position)
+            lr_first[slot] = smallest_position
+
+    groups_by_size = array("I", sorted(
+        range(len(group_sums)),
+        key=lambda group: group_starts[group] - group_starts[group + 1]
+    ))
+
+    prefix_sums = [0]
+    for value in values:
+        prefix_sums.append(prefix_sums[-1] + value)
+
+    return (
+        group_sums,
+        group_starts,
+        sorted_lefts,
+        sorted_rights,
+        lr_lefts,
+        lr_first,
+        groups_by_size,
+        prefix_sums,
+        max_chant_length,
+        {},
+        [0]
+    )
+
+
+def find_first_chant(range_index: tuple, group: int, min_left: int) -> int:
+    """Find the first chant of a group, in (r, l) order, with l >= min_left.
+
+    Args:
+        range_index: tuple from build_range_index.
+        group: int, group number.
+        min_left: int, smallest allowed left end.
+
+    Returns:
+        int: sorted position of the chant, or N if there is none.
+    """
+    group_starts, lr_lefts, lr_first = (
+        range_index[1],
+        range_index[4],
+        range_index[5]
+    )
+    group_end = group_starts[group + 1]
+    slot = bisect_left(lr_lefts, min_left, group_starts[group], group_end)
+    if slot == group_end:
+        return len(lr_first)
+    return lr_first[slot]
+
+
+def find_next_chant(
+    range_index: tuple,
+    group: int,
+    position: int,
+    min_gap: int
+) -> int:
+    """Find the chant the greedy takes after the one at position, for D.
+
+    Args:
+        range_index: tuple from build_range_index.
+        group: int, group number of the chant at position.
+        position: int, sorted position of the chant.
+        min_gap: int, D.
+
+    Returns:
+        int: sorted position of the next chant, or N if there is none.
+    """
+    return find_first_chant(
+        range_index,
+        group,
+        range_index[3][position] + min_gap + 1
+    )
+
+
+def group_jump_tables(range_index: tuple, group: int, min_gap: int) -> list:
+    """Get the skip-pointer tables of one group for a given D.
+
+    Level k maps each chant of the group, by its offset in the group, to
+    the chant the greedy takes RANGE_JUMP_BASE^k steps later; position N
+    is the end of the chain. Levels stop once a jump would span the group,
+    and each is derived from the previous one by log2(RANGE_JUMP_BASE)
+    doublings. Tables are built on first use and cached per (group, D);
+    the oldest are evicted once the cache covers more than
+    RANGE_JUMP_CACHE_CHANTS chants.
+
+    Args:
+        range_index: tuple from build_range_index.
+        group: int, group number.
+        min_gap: int, D.
+
+    Returns:
+        list: array('I') of length G per level.
+    """
+    group_starts, jump_cache, cached_chants = (
+        range_index[1],
+        range_index[9],
+        range_index[10]
+    )
+    jump_tables = jump_cache.get((group, min_gap))
+    if jump_tables is not None:
+        return jump_tables
+
+    total_chants = len(range_index[3])
+    group_start = group_starts[group]
+    group_size = group_starts[group + 1] - group_start
+
+    jumps = array("I", [
+        find_next_chant(range_index, group, position, min_gap)
+        for position in range(group_start, group_start + group_size)
+    ])
+    jump_tables = [jumps]
+    while RANGE_JUMP_BASE ** len(jump_tables) < group_size:
+        for _ in range(RANGE_JUMP_BASE.bit_length() - 1):
+            jumps = array("I", [
+                jump if jump == total_chants else jumps[jump - group_start]
+                for jump in jumps
+            ])
+        jump_tables.append(jumps)
+
+    while jump_cache and (
+        cached_chants[0] + group_size > RANGE_JUMP_CACHE_CHANTS
+    ):
+        evicted_key = next(iter(jump_cache))
+        cached_chants[0] -= len(jump_cache.pop(evicted_key)[0])
+    jump_cache[(group, min_gap)] = jump_tables
+    cached_chants[0] += group_size
+    return jump_tables
+
+
+def measure_range_chain(
+    range_index: tuple,
+    group: int,
+    chain_start: int,
+    query_end: int,
+    min_gap: int
+) -> int:
+    """Count the chants of a greedy chain that end no later than y.
+
+    Without cached jump tables for (group, D) the chain is walked one
+    probe at a time. Once the walk covers 1 / RANGE_JUMP_WALK_SHARE of the
+    group, the tables are built, which costs O(log G) times the walk so
+    far, and the rest of the chain is measured on them.
+
+    Args:
+        range_index: tuple from build_range_index.
+        group: int, group number of the chain.
+        chain_start: int, sorted position of the chain's first chant.
+        query_end: int, y (1-based, inclusive).
+        min_gap: int, D.
+
+    Returns:
+        int: chain length.
+    """
+    sorted_rights = range_index[3]
+    total_chants = len(sorted_rights)
+
+    group_start = range_index[1][group]
+    group_size = range_index[1][group + 1] - group_start
+
+    position = chain_start
+    chain_length = 1
+    jump_tables = range_index[9].get((group, min_gap))
+    while jump_tables is None:
+        jump = find_next_chant(range_index, group, position, min_gap)
+        if jump == total_chants or sorted_rights[jump] > query_end:
+            return chain_length
+        position = jump
+        chain_length += 1
+        if chain_length * RANGE_JUMP_WALK_SHARE >= group_size:
+            jump_tables = group_jump_tables(range_index, group, min_gap)
+
+    for level in range(len(jump_tables) - 1, -1, -1):
+        jumps = jump_tables[level]
+        while True:
+            jump = jumps[position - group_start]
+            if jump == total_chants or sorted_rights[jump] > query_end:
+                break
+            position = jump
+            chain_length += RANGE_JUMP_BASE ** level
+
+    return chain_length
+
+
+def window_groups(range_index: tuple, query_start: int, query_end: int) -> list:
+    """List the groups whose sum occurs in [x, y], in ascending sum order.
+
+    Args:
+        range_index: tuple from build_range_index.
+        query_start: int, x (1-based).
+        query_end: int, y (1-based, inclusive).
+
+    Returns:
+        list: group numbers, ascending.
+    """
+    group_sums = range_index[0]
+    prefix_sums, max_chant_length = range_index[7], range_index[8]
+    window_sums = set()
+    for left_position in range(query_start, query_end + 1):
+        max_right = min(query_end, left_position + max_chant_length - 1)
+        for right_position in range(left_position, max_right + 1):
+            window_sums.add(
+                prefix_sums[right_position] - prefix_sums[left_position - 1]
+            )
+    return [
+        bisect_left(group_sums, window_sum)
+        for window_sum in sorted(window_sums)
+    ]
+
+
+def query_range(
+    range_index: tuple,
+    query_start: int,
+    query_end: int,
+    min_gap: int
+) -> tuple:
+    """Solve the problem on the subarray [x, y] of the indexed array.
+
+    A candidate group is probed for its first chant inside [x, y] in
+    O(log N), and its greedy chain up to y is measured by
+    measure_range_chain in O(log G) per chant, or in
+    O(RANGE_JUMP_BASE * levels) once the group has jump tables for D.
+    Tables are only built for a chain covering 1 / RANGE_JUMP_WALK_SHARE
+    of its group, so a query costs at most O(log G) times its direct walk.
+    Groups no larger than the best count are skipped. Candidates come
+    from whichever source is smaller:
+
+        - for a window holding fewer chants W than there are groups, the
+          sums occurring in it, in ascending order, so a query costs
+          O(W log W) plus the probes, and the scan stops once the count
+          reaches (y - x + 1 + D) // (D + 1);
+        - otherwise the groups by decreasing size, stopping at the first
+          group smaller than the best count. Inputs whose window answer is
+          1 may still visit every group.
+
+    Args:
+        range_index: tuple from build_range_index.
+        query_start: int, x (1-based).
+        query_end: int, y (1-based, inclusive).
+        min_gap: int, D.
+
+    Returns:
+        tuple: (best_sum, selected_chants), with chant positions relative
+            to x, exactly as if the subarray were solved on its own.
+    """
+    (
+        group_sums,
+        group_starts,
+        sorted_lefts,
+        sorted_rights,
+        _,
+        _,
+        groups_by_size,
+        _,
+        max_chant_length,
+        _,
+        _
+    ) = range_index
+    total_chants = len(sorted_rights)
+
+    window_length = query_end - query_start + 1
+    count_limit = (window_length + min_gap) // (min_gap + 1)
+    by_window = count_total_chants(window_length, max_chant_length) < len(
+        group_sums
+    )
+    if by_window:
+        candidate_groups = window_groups(range_index, query_start, query_end)
+    else:
+        candidate_groups = groups_by_size
+
+    best_count = 0
+    best_group = len(group_sums)
+    best_start = total_chants
+
+    for group in candidate_groups:
+        group_size = group_starts[group + 1] - group_starts[group]
+        if group_size < best_count or (
+            group_size == best_count and group > best_group
+        ):
+            if by_window:
+                continue
+            break
+
+        chain_start = find_first_chant(range_index, group, query_start)
+        if chain_start == total_chants or sorted_rights[chain_start] > query_end:
+            continue
+
+        current_count = measure_range_chain(
+            range_index,
+            group,
+            chain_start,
+            query_end,
+            min_gap
+        )
+        if current_count > best_count or (
+            current_count == best_count and group < best_group
+        ):
+            best_count = current_count
+            best_group = group
+            best_start = chain_start
+            if by_window and best_count >= count_limit:
+                break
+
+    shift = query_start - 1
+    selected_chants = []
+    position = best_start
+    while position < total_chants and sorted_rights[position] <= query_end:
+        selected_chants.append(
+            (sorted_lefts[position] - shift, sorted_rights[position] - shift)
+        )
+        position = find_next_chant(range_index, best_group, position, min_gap)
+
+    return group_sums[best_group], selected_chants
+
+
+def encode_chant(left_position: int, right_position: int, max_chant_length: int) -> int:
+    """Pack a chant into one int that orders chants by (r, l)."""
+    return (
+        right_position * max_chant_length
+        + left_position - right_position + max_chant_length - 1
+    )
+
+
+def greedy_encoded_chants(
+    chant_keys: list,
+    max_chant_length: int,
+    min_gap: int
+) -> list:
+    """Run the greedy over a sorted list of encode_chant keys.
+
+    Args:
+        chant_keys: list of int, encoded chants of one sum, ascending.
+        max_chant_length: int, maximum allowed chant length M.
+        min_gap: int, D.
+
+    Returns:
+        list: list of (l, r) pairs in required output order.
+    """
+    selected_chants = []
+    last_end = -10**30
+    for chant_key in chant_keys:
+        right_position, length_field = divmod(chant_key, max_chant_length)
+        left_position = right_position - max_chant_length + 1 + length_field
+        if left_position > last_end + min_gap:
+            selected_chants.append((left_position, right_position))
+            last_end = right_position
+    return selected_chants
+
+
+def build_dynamic_solver(
+    values: list,
+    max_chant_length: int,
+    min_gap: int
+) -> tuple:
+    """Build a solver that supports point updates of the array.
+
+    Chants are kept per sum as sorted lists of encode_chant keys, with the
+    greedy count of every sum and a lazily pruned heap over (-k, S).
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+        min_gap: int, D.
+
+    Returns:
+        tuple: (values, max_chant_length, min_gap, chant_groups,
+            group_counts, count_heap)
+            - values: list of int, a private copy of the array
+            - chant_groups: dict, sum -> sorted list of chant keys
+            - group_counts: dict, sum -> greedy count k
+            - count_heap: list, heap of (-k, sum), possibly stale
+    """
+    values = list(values)
+    array_length = len(values)
+    chant_groups = {}
+
+    # Visiting right ends, then left ends, in increasing order appends the
+    # keys of every group already sorted.
+    for right_position in range(1, array_length + 1):
+        min_left = max(1, right_position - max_chant_length + 1)
+        running_sum = sum(values[min_left - 1:right_position])
+        for left_position in range(min_left, right_position + 1):
+            chant_groups.setdefault(running_sum, []).append(
+                encode_chant(left_position, right_position, max_chant_length)
+            )
+            running_sum -= values[left_position - 1]
+
+    group_counts = {
+        current_sum: len(
+            greedy_encoded_chants(chant_keys, max_chant_length, min_gap)
+        )
+        for current_sum, chant_keys in chant_groups.items()
+    }
+    count_heap = [
+        (-current_count, current_sum)
+        for current_sum, current_count in group_counts.items()
+    ]
+    heapq.heapify(count_heap)
+
+    return (
+        values,
+        max_chant_length,
+        min_gap,
+        chant_groups,
+        group_counts,
+        count_heap
+    )
+
+
+def update_dynamic_solver(solver: tuple, position: int, value: int) -> None:
+    """Set a[i] = value and move the chants that cover i between groups.
+
+    Only the at most M^2 chants containing i change their sum. The greedy
+    is re-run for the sums they leave or join, and a fresh heap entry is
+    pushed for each of those sums.
+
+    Args:
+        solver: tuple from build_dynamic_solver, updated in place.
+        position: int, i (1-based).
+        value: int, the new a[i].
+    """
+    (
+        values,
+        max_chant_length,
+        min_gap,
+        chant_groups,
+        group_counts,
+        count_heap
+    ) = solver
+    array_length = len(values)
+    delta = value - values[position - 1]
+    if delta == 0:
+        return
+
+    touched_sums = set()
+    for left_position in range(
+        max(1, position - max_chant_length + 1),
+        position + 1
+    ):
+        max_right = min(array_length, left_position + max_chant_length - 1)
+        running_sum = sum(values[left_position - 1:position - 1])
+        for right_position in range(position, max_right + 1):
+            running_sum += values[right_position - 1]
+            chant_key = encode_chant(
+                left_position,
+                right_position,
+                max_chant_length
+            )
+
+            old_group = chant_groups[running_sum]
+            del old_group[bisect_left(old_group, chant_key)]
+            if not old_group:
+                del chant_groups[running_sum]
+            insort(chant_groups.setdefault(running_sum + delta, []), chant_key)
+            touched_sums.add(running_sum)
+            touched_sums.add(running_sum + delta)
+
+    values[position - 1] = value
+
+    for current_sum in touched_sums:
+        chant_keys = chant_groups.get(current_sum)
+        if chant_keys is None:
+            group_counts.pop(current_sum, None)
+            continue
+        current_count = len(
+            greedy_encoded_chants(chant_keys, max_chant_length, min_gap)
+        )
+        group_counts[current_sum] = current_count
+        heapq.heappush(count_heap, (-current_count, current_sum))
+
+    if len(count_heap) > 2 * len(group_counts) + DYNAMIC_HEAP_SLACK:
+        count_heap[:] = [
+            (-current_count, current_sum)
+            for current_sum, current_count in group_counts.items()
+        ]
+        heapq.heapify(count_heap)
+
+
+def query_dynamic_solver(solver: tuple) -> tuple:
+    """Answer the problem for the current array of a dynamic solver.
+
+    Args:
+        solver: tuple from build_dynamic_solver.
+
+    Returns:
+        tuple: (best_sum, selected_chants)
+    """
+    _, max_chant_length, min_gap, chant_groups, group_counts, count_heap = solver
+
+    while True:
+        negative_count, best_sum = count_heap[0]
+        if group_counts.get(best_sum) == -negative_count:
+            break
+        heapq.heappop(count_heap)
+
+    return best_sum, greedy_encoded_chants(
+        chant_groups[best_sum],
+        max_chant_length,
+        min_gap
+    )
+
+
+def sample_sum_statistics(values: list, max_chant_length: int) -> tuple:
+    """Estimate distinct-sum density and group skew from sampled blocks.
+
+    The chants inside SAMPLE_BLOCKS evenly spaced blocks of
+    SAMPLE_BLOCK_LENGTH stones are counted by sum. Neighbouring chants of
+    one block share stones, so their sums collide far more often than two
+    chants drawn from the whole array; the collision rate therefore only
+    counts pairs taken from different blocks.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+
+    Returns:
+        tuple: (distinct_ratio, top_share, collision_rate)
+            - distinct_ratio: float, distinct sums per sampled chant
+            - top_share: float, share of sampled chants in the largest group
+            - collision_rate: float, chance that two sampled chants from
+              different blocks have the same sum
+    """
+    array_length = len(values)
+    block_length = min(SAMPLE_BLOCK_LENGTH, array_length)
+    block_count = min(SAMPLE_BLOCKS, array_length // block_length)
+    block_spacing = (array_length - block_length) // max(1, block_count - 1)
+
+    sum_counts = {}
+    same_block_pairs = 0
+    block_pairs = 0
+    for block in range(block_count):
+        block_values = values[
+            block * block_spacing:block * block_spacing + block_length
+        ]
+        block_counts = {}
+        for left_position in range(block_length):
+            running_sum = 0
+            for value in block_values[
+                left_position:left_position + max_chant_length
+            ]:
+                running_sum += value
+                block_counts[running_sum] = block_counts.get(running_sum, 0) + 1
+
+        block_chants = sum(block_counts.values())
+        block_pairs += block_chants * block_chants
+        for chant_sum, count in block_counts.items():
+            same_block_pairs += count * count
+            sum_counts[chant_sum] = sum_counts.get(chant_sum, 0) + count
+
+    sampled_chants = sum(sum_counts.values())
+    same_sum_pairs = sum(count * count for count in sum_counts.values())
+    if block_count > 1:
+        collision_rate = (same_sum_pairs - same_block_pairs) / (
+            sampled_chants * sampled_chants - block_pairs
+        )
+    else:
+        collision_rate = (same_sum_pairs - sampled_chants) / max(
+            1,
+            sampled_chants * (sampled_chants - 1)
+        )
+    return (
+        len(sum_counts) / sampled_chants,
+        max(sum_counts.values()) / sampled_chants,
+        collision_rate
+    )
+
+
+def estimate_engine_costs(
+    array_length: int,
+    run_count: int,
+    max_chant_length: int,
+    top_share: float,
+    collision_rate: float
+) -> dict:
+    """Estimate the running time of every applicable engine in seconds.
+
+    Costs come from ENGINE_COSTS. The expected number of other chants
+    sharing a chant's sum, collision_rate * N, is taken as Poisson to give
+    the share of chants whose sum repeats and the distinct sums per chant.
+    The run-length engine pays per stone, per (run, length) pair and per
+    chant crossing a run boundary instead of per chant.
+
+    Args:
+        array_length: int, n.
+        run_count: int, number of constant runs in the array.
+        max_chant_length: int, maximum allowed chant length M.
+        top_share: float, from sample_sum_statistics.
+        collision_rate: float, from sample_sum_statistics.
+
+    Returns:
+        dict: engine name -> estimated seconds, cheapest-to-build first.
+    """
+    total_chants = count_total_chants(array_length, max_chant_length)
+    shared_chants = collision_rate * total_chants
+    repeated_share = 1.0 - math.exp(-shared_chants)
+    distinct_share = (
+        repeated_share / shared_chants if shared_chants else 1.0
+    )
+
+    engines = ["general", "filtered", "lazy"]
+    if max_chant_length <= MAX_SHORT_CHANT_LENGTH:
+        engines.append("short")
+    if np is not None:
+        engines.append("vectorized")
+
+    engine_costs = {}
+    for engine in engines:
+        fixed_seconds, per_chant, per_distinct, per_repeated, per_top = (
+            ENGINE_COSTS[engine]
+        )
+        engine_costs[engine] = fixed_seconds + total_chants * 1e-6 * (
+            per_chant
+            + per_distinct * distinct_share
+            + per_repeated * repeated_share
+            + per_top * top_share
+        )
+    if gil_disabled():
+        worker_count = os.cpu_count() or 1
+        general_fixed_seconds = ENGINE_COSTS["general"][0]
+        engine_costs["threaded"] = general_fixed_seconds + (
+            engine_costs["general"] - general_fixed_seconds
+        ) * (THREADED_SERIAL_SHARE + (1 - THREADED_SERIAL_SHARE) / worker_count)
+
+    per_stone, per_run_length, per_crossing = RUN_ENGINE_COSTS
+    crossing_chants = (run_count - 1) * max_chant_length * (
+        max_chant_length - 1
+    ) // 2
+    engine_costs["runs"] = 1e-6 * (
+        per_stone * array_length
+        + per_run_length * run_count * max_chant_length
+        + per_crossing * crossing_chants
+    )
+    return engine_costs
+
+
+def choose_engine(values: list, max_chant_length: int) -> tuple:
+    """Pick the engine for an input and describe why.
+
+    Periodic inputs always take the periodic engine. Otherwise the input is
+    sampled and the engine with the lowest estimated cost wins.
+
+    Args:
+        values: list of int, array values (0-based indexing).
+        max_chant_length: int, maximum allowed chant length M.
+
+    Returns:
+        tuple: (engine, period, reason)
+            - engine: str, one of periodic, short, vectorized, filtered,
+              lazy, runs, threaded, general
+            - period: int, the period for the periodic engine, else 0
+            - reason: str, one line for the log
+    """
+    period = detect_period(values, MAX_PERIOD)
+    if period:
+        return "periodic", period, f"period={period}"
+
+    total_chants = count_total_chants(len(values), max_chant_length)
+    run_count = 1 + sum(
+        1 for position in range(1, len(values))
+        if values[position] != values[position - 1]
+    )
+    distinct_ratio, top_share, collision_rate = sample_sum_statistics(
+        values,
+        max_chant_length
+    )
+    engine_costs = estimate_engine_costs(
+        len(values),
+        run_count,
+        max_chant_length,
+        top_share,
+        collision_rate
+    )
+    engine = min(engine_costs, key=engine_costs.get)
+    estimates = " ".join(
+        f"{name}={seconds:.3f}s" for name, seconds in engine_costs.items()
+    )
+    reason = (
+        f"N={total_chants} runs={run_count} distinct={distinct_ratio:.3f} "
+        f"top={top_share:.3f} collisions={collision_rate:.3g} "
+        f"estimates: {estimates}"
+    )
+    return engine, 0, reason
+
+
+def main() -> None:
+    """Run the algorithm and print the unique optimal set of chants.
+
+    An optional command-line argument names a chant index file. It is
+    reused when it matches the input's (values, M) and rebuilt otherwise,
+    so repeated runs with different D skip building and sorting.
+    """
+    array_length, max_chant_length, min_gap, values = read_input()
+    index_path = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if index_path is not None:
+        chant_index = load_chant_index(index_path, values, max_chant_length)
+        if chant_index is None:
+            save_chant_index(index_path, values, max_chant_length)
+            chant_index = load_chant_index(
+                index_path,
+                values,
+                max_chant_length
+            )
+        answer = solve_from_chant_index(chant_index, min_gap)
+    else:
+        engine, period, reason = choose_engine(values, max_chant_length)
+        sys.stderr.write(f"engine: {engine} ({reason})\n")
+        if engine == "periodic":
+            answer = solve_periodic(values, period, max_chant_length, min_gap)
+        elif engine == "short":
+            answer = solve_short(values, max_chant_length, min_gap)
+        elif engine == "vectorized":
+            answer = solve_vectorized(values, max_chant_length, min_gap)
+        elif engine == "runs":
+            answer = solve_runs(values, max_chant_length, min_gap)
+        elif engine == "lazy":
+            answer = solve_lazy(values, max_chant_length, min_gap)
+        elif engine == "threaded":
+            answer = solve_threaded(values, max_chant_length, min_gap)
+        elif engine == "general":
+            answer = solve_general(values, max_chant_length, min_gap)
+        elif engine == "filtered":
+            answer = solve_filtered(values, max_chant_length, min_gap)
+        else:
+            raise ValueError(f"unknown engine: {engine}")
+    if answer is None:
+        answer = solve_filtered(values, max_chant_length, min_gap)
+    best_sum, selected_chants = answer
 
-    best_sum = int(best_sum_key - SUM_BIAS)
     output_lines = [f"{len(selected_chants)} {best_sum}\n"]
     for left_position, right_position in selected_chants:
         output_lines.append(f"{left_position} {right_position}\n")
@@ -333,4 +2853,4 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()